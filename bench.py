@@ -0,0 +1,71 @@
+from libs.benchlib.suite import (
+    DEFAULT_RESOLUTIONS,
+    DEFAULT_TRACKS,
+    compareReports,
+    formatTable,
+    loadReport,
+    runSuite,
+    saveReport,
+)
+from argparse import ArgumentParser
+import logging
+
+COLUMNS: list[str] = [
+    "stage",
+    "width",
+    "height",
+    "tracks",
+    "p50Ms",
+    "p90Ms",
+    "p99Ms",
+    "perSecond",
+    "allocPeakBytes",
+]
+
+
+def parseResolution(value: str) -> tuple[int, int]:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def parseArgs():
+    parser = ArgumentParser(description="benchmark tracking and drawing without a model")
+    parser.add_argument(
+        "--resolutions",
+        nargs="+",
+        type=parseResolution,
+        default=DEFAULT_RESOLUTIONS,
+        help="WIDTHxHEIGHT, e.g. 1280x720",
+    )
+    parser.add_argument("--tracks", nargs="+", type=int, default=DEFAULT_TRACKS)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--alloc-iterations", type=int, default=20)
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", default="", help="earlier report to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = parseArgs()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    report = runSuite(
+        args.resolutions,
+        args.tracks,
+        iterations=args.iterations,
+        warmup=args.warmup,
+        allocIterations=args.alloc_iterations,
+    )
+    saveReport(report, args.output)
+    print(formatTable(report["results"], COLUMNS))
+
+    if args.compare:
+        rows = compareReports(loadReport(args.compare), report)
+        if rows:
+            print()
+            print(formatTable(rows, list(rows[0])))
+
+
+if __name__ == "__main__":
+    main()
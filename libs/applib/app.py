@@ -1,107 +1,511 @@
 from libs.filterlib.filter import FilterLib
-from libs.screenlib.screen import Screen
+from libs.filterlib.engine import InferenceEngine
+from libs.filterlib.motion import MotionGate
+from libs.filterlib.roi import RegionOfInterest
+from .pipeline import Pipeline
+from libs.screenlib.screen import HEALTH_STATES, Screen, setReconnectLimit
+from libs.screenlib.sources import SourceResolver
+from libs.sinklib import DetectionSink
+from libs.metricslib import (
+    MetricsRegistry,
+    MetricsReporter,
+    MetricsServer,
+    StageStats,
+    stageSamples,
+)
 from cv2 import destroyAllWindows, waitKey
 from libs.utilslib import getDictV
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from time import sleep, perf_counter
+from typing import Callable
 import threading
 
+logger = getLogger(__name__)
+
+# screen keys that need a new capture connection when they change
+CAPTURE_KEYS: tuple = ("source", "scale", "clock", "capture", "reconnect")
+# screen keys that only need a new filter chain
+FILTER_KEYS: tuple = ("filter", "yolo", "roi", "motion", "detections")
+# top-level tables read once at startup
+RESTART_KEYS: tuple = ("sources", "metrics", "gui")
+
+
+def _changed(before: dict, after: dict, keys: tuple) -> bool:
+    return any(before.get(key) != after.get(key) for key in keys)
+
 class App:
     screens: list[Screen] = list()
     configData: dict = dict()
 
     def __init__(self, configData: dict):
         self.configData = configData
+        self.engine: InferenceEngine = InferenceEngine()
+        self.filterLibs: dict[str, FilterLib] = dict()
+        self._reloadLock: threading.Lock = threading.Lock()
+        self._display: bool = True
+        self.timings: dict[str, float] = dict()
+
+        # weights load and warm up while the capture sources are being opened
+        beginTime = perf_counter()
+        yoloConfig: dict | None = configData.get("yolo")
+        modelLoader = (
+            self.engine.preload(
+                yoloConfig["model"],
+                backend=getDictV(yoloConfig, "backend", "pytorch"),
+                imgsz=getDictV(yoloConfig, "imgsz", 640),
+                threads=getDictV(yoloConfig, "threads", 0),
+                warmup=getDictV(yoloConfig, "warmup", True),
+            )
+            if yoloConfig
+            else None
+        )
+
+        sourcesConfig: dict = configData.get("sources", dict())
+        self.resolver: SourceResolver = SourceResolver(
+            cachePath=getDictV(sourcesConfig, "cache", default=".cache/sources.json"),
+            ttl=getDictV(sourcesConfig, "ttl", default=3600.0),
+            refreshMargin=getDictV(sourcesConfig, "refreshMargin", default=300.0),
+        )
+        reconnectConfig: dict = configData.get("reconnect", dict())
+        setReconnectLimit(getDictV(reconnectConfig, "maxConcurrent", default=4))
         self.setupScreens()
+
+        if modelLoader is not None:
+            waitTime = perf_counter()
+            modelLoader.join()
+            self.timings["modelWait"] = perf_counter() - waitTime
+        self.timings["total"] = perf_counter() - beginTime
+        logger.info(
+            "startup %s",
+            ", ".join(f"{key} {value:.2f}s" for key, value in self.timings.items()),
+        )
         self._running = False
 
         self.capture_thread = threading.Thread(target=self.captureThread)
         self.display_thread = threading.Thread(target=self.displayThread)
+        self.pipeline: Pipeline | None = None
+        self.sinks: list = list()
+
+        self.stats: StageStats = StageStats()
+        self.metrics: MetricsRegistry = MetricsRegistry()
+        self.metrics.addCollector(self.collectMetrics)
+        self.metricsServer: MetricsServer | None = None
+        self.metricsReporter: MetricsReporter | None = None
+
+    @property
+    def running(self) -> bool:
+        if self.pipeline is not None:
+            return self.pipeline.running
+        return self.capture_thread.is_alive() or self.display_thread.is_alive()
+
+    def openScreen(self, k: str, v: dict) -> Screen:
+        scale: float = getDictV(v, "scale", default=1.0)
+        clock: str = getDictV(v, "clock", default="auto")
+        capture: dict = getDictV(v, "capture", default=dict())
+        # per-screen [screens.*.reconnect] keys override the shared [reconnect] table
+        reconnect: dict = {
+            **self.configData.get("reconnect", dict()),
+            **getDictV(v, "reconnect", default=dict()),
+        }
+        return Screen(
+            v["source"],
+            k,
+            scale=scale,
+            clock=clock,
+            captureOptions=capture,
+            reconnectOptions=reconnect,
+            resolver=self.resolver,
+        )
 
     def setupScreens(self):
-        for k, v in self.configData["screens"].items():
-            scale: float = getDictV(v, "scale", default=1.0)
-            screen: Screen = Screen(v["source"], k, scale=scale)
+        screensConfig: dict = self.configData["screens"]
 
-            self.setupRecord(screen, v)
-            self.setupFilter(screen, v.get("filter", dict()))
+        # opening a stream and resolving web sources is mostly waiting on the
+        # network, do them all at once
+        beginTime = perf_counter()
+        with ThreadPoolExecutor(max_workers=max(len(screensConfig), 1)) as pool:
+            opened = list(pool.map(self.openScreen, screensConfig, screensConfig.values()))
+        self.timings["captures"] = perf_counter() - beginTime
 
+        beginTime = perf_counter()
+        for screen, v in zip(opened, screensConfig.values()):
+            self.setupScreen(screen, v)
             self.screens.append(screen)
+        self.timings["filters"] = perf_counter() - beginTime
 
-    def setupFilter(self, screen: Screen, v: dict) -> None:
+    def setupScreen(self, screen: Screen, v: dict) -> None:
+        self.setupRecord(screen, v)
+        self.setupShared(screen, v)
+        self.setupFilter(screen, v)
+
+    def buildFilterLib(self, screen: Screen, v: dict) -> tuple[FilterLib, list[Callable]]:
+        name = screen.name
         yoloConfig = self.configData.get("yolo")
-        filterLib = FilterLib(yoloConfig)
+        if yoloConfig is not None:
+            # per-screen [screens.*.yolo] keys override the shared [yolo] table
+            yoloConfig = {**yoloConfig, **v.get("yolo", dict())}
+        filterLib = FilterLib(yoloConfig, engine=self.engine)
 
+        chain = filterLib.buildChain(v.get("filter", dict()))
+        self.setupROI(filterLib, v)
+        self.setupMotion(filterLib, v)
         if filterLib.yoloModel is not None:
-            screen.addFilter(filterLib.yoloModel.update)
-
-        v = {
-            key: val for key, val in sorted(v.items(), key=lambda ele: ele[1]["index"])
-        }
+            filterLib.yoloModel.dropCounter = lambda: screen.droppedFrames
+        if self.setupDetections(filterLib, name, v):
+            chain.append(filterLib.recordDetections)
+        return filterLib, chain
 
-        for key, params in v.items():
-            func = None
-
-            if key == "trailBalls":
-                func = filterLib.trailBalls
-
-                if filterLib.yoloModel is None:
-                    continue
+    def setupFilter(self, screen: Screen, v: dict) -> None:
+        filterLib, chain = self.buildFilterLib(screen, v)
+        self.filterLibs[screen.name] = filterLib
 
-                maxBalls: int = getDictV(params, "maxBalls", default=30)
-                filterLib.yoloModel.maxBallTrack = maxBalls
+        for func in chain:
+            screen.addFilter(func)
 
-                ballThickness: int = getDictV(params, "ballThickness", default=5)
-                filterLib.yoloModel.ballThickness = ballThickness
+    def setupROI(self, filterLib: FilterLib, v: dict) -> None:
+        roi: dict | None = v.get("roi")
+        yoloModel = filterLib.yoloModel
+        if roi is None or yoloModel is None:
+            return
 
-            elif key == "stopBoxes":
-                func = filterLib.stopBoxes
+        crop: list = getDictV(roi, "crop", default=list())
+        polygons: list = getDictV(roi, "polygons", default=list())
+        yoloModel.roi = RegionOfInterest(crop=crop or None, polygons=polygons)
 
-                if filterLib.yoloModel is None:
-                    continue
+    def setupMotion(self, filterLib: FilterLib, v: dict) -> None:
+        motion: dict | None = v.get("motion")
+        yoloModel = filterLib.yoloModel
+        if motion is None or yoloModel is None:
+            return
 
-                stopTime: int = getDictV(params, "stopTime", default=5)
-                filterLib.yoloModel.stopTimeThreshold = stopTime
+        yoloModel.motionGate = MotionGate(
+            pixelThreshold=getDictV(motion, "pixelThreshold", default=25),
+            minArea=getDictV(motion, "minArea", default=0.002),
+            width=getDictV(motion, "width", default=160),
+            learningRate=getDictV(motion, "learningRate", default=0.05),
+            holdFrames=getDictV(motion, "holdFrames", default=5),
+        )
 
-                triggerColor: list = getDictV(
-                    params, "triggerColor", default=[56, 26, 211]
-                )
-                filterLib.yoloModel.triggerColor = triggerColor
+    def setupDetections(self, filterLib: FilterLib, name: str, v: dict) -> bool:
+        detections: dict = v.get("detections", dict())
+        output: str = getDictV(detections, "output", default="")
+        if not output or filterLib.yoloModel is None:
+            return False
 
-            elif key == "fps":
-                func = filterLib.displayFPS
+        flushInterval: float = getDictV(detections, "flushInterval", default=1.0)
+        batchSize: int = getDictV(detections, "batchSize", default=512)
+        filterLib.setDetectionSink(
+            DetectionSink(output, flushInterval=flushInterval, batchSize=batchSize),
+            name,
+        )
+        return True
 
-            if func is None:
-                continue
-            screen.addFilter(func)
+    def setupShared(self, screen: Screen, v: dict) -> None:
+        shared: dict = v.get("shared", dict())
+        name: str = getDictV(shared, "name", default="")
+        capacity: int = getDictV(shared, "capacity", default=3)
+        frames: str = getDictV(shared, "frames", default="origin")
+        if frames not in ("origin", "filter"):
+            raise ValueError(f"shared frames must be origin or filter, receive '{frames}'")
+        screen.setupShared(name, capacity=capacity, origin=frames == "origin")
 
     def setupRecord(self, screen: Screen, v: dict) -> None:
         record: dict[str, int | str] = v.get("record", dict())
         output: str = str(record.get("output", ""))
         fps: int = int(record.get("fps", 24))
         fourcc: str = str(record.get("fourcc", "XVID"))
-        screen.setupOutSource(output, fourcc, fps)
+        frames: str = str(record.get("frames", "origin"))
+        if frames not in ("origin", "filter"):
+            raise ValueError(f"record frames must be origin or filter, receive '{frames}'")
+        screen.setupOutSource(
+            output,
+            fourcc,
+            fps,
+            origin=frames == "origin",
+            queueSize=int(record.get("queueSize", 32)),
+            policy=str(record.get("policy", "drop")),
+            segmentSeconds=float(record.get("segmentSeconds", 0)),
+            segmentBytes=int(float(record.get("segmentMB", 0)) * 1024 * 1024),
+        )
+
+    def addSink(self, sink) -> None:
+        self.sinks.append(sink)
+
+    def reload(self, configData: dict) -> None:
+        # rebuild only what the new config changes, models stay loaded in the
+        # engine and untouched screens keep their capture connection
+        with self._reloadLock:
+            oldConfig, self.configData = self.configData, configData
+            oldScreens: dict = oldConfig["screens"]
+            newScreens: dict = configData["screens"]
+            yoloConfig: dict | None = configData.get("yolo")
+            yoloChanged = oldConfig.get("yolo") != yoloConfig
+            # [reconnect] feeds every screen's capture settings, reopen them all
+            reconnectConfig: dict = configData.get("reconnect", dict())
+            oldReconnect: dict = oldConfig.get("reconnect", dict())
+            maxConcurrent: int = getDictV(reconnectConfig, "maxConcurrent", default=4)
+            if getDictV(oldReconnect, "maxConcurrent", default=4) != maxConcurrent:
+                setReconnectLimit(maxConcurrent)
+            screenKeys = (oldReconnect.keys() | reconnectConfig.keys()) - {"maxConcurrent"}
+            reconnectChanged = _changed(oldReconnect, reconnectConfig, tuple(screenKeys))
+            for key in RESTART_KEYS:
+                if oldConfig.get(key) != configData.get(key):
+                    logger.warning("[%s] changed, restart to apply it", key)
+            if yoloChanged and yoloConfig:
+                # load and warm the new weights before any screen switches over
+                self.engine.preload(
+                    yoloConfig["model"],
+                    backend=getDictV(yoloConfig, "backend", "pytorch"),
+                    imgsz=getDictV(yoloConfig, "imgsz", 640),
+                    threads=getDictV(yoloConfig, "threads", 0),
+                    warmup=getDictV(yoloConfig, "warmup", True),
+                ).join()
+
+            current = {screen.name: screen for screen in self.screens}
+            retiredScreens: list[Screen] = list()
+            retiredFilters: list[FilterLib] = list()
+            changes: dict[str, int] = dict(added=0, removed=0, reopened=0, updated=0)
+
+            for name in oldScreens.keys() - newScreens.keys():
+                self.screens.remove(current[name])
+                retiredScreens.append(current[name])
+                retiredFilters.append(self.filterLibs.pop(name))
+                changes["removed"] += 1
+
+            for name, v in newScreens.items():
+                before: dict | None = oldScreens.get(name)
+                if before is None or reconnectChanged or _changed(before, v, CAPTURE_KEYS):
+                    screen = self.openScreen(name, v)
+                    oldFilter = self.filterLibs.get(name)
+                    self.setupScreen(screen, v)
+                    if before is None:
+                        self.screens.append(screen)
+                        changes["added"] += 1
+                    else:
+                        self.screens[self.screens.index(current[name])] = screen
+                        retiredScreens.append(current[name])
+                        retiredFilters.append(oldFilter)
+                        changes["reopened"] += 1
+                    if self._running:
+                        self.updateRendering(screen)
+                        screen.startCapture()
+                    continue
+
+                screen = current[name]
+                updated = False
+                if _changed(before, v, ("record",)):
+                    self.setupRecord(screen, v)
+                    updated = True
+                if _changed(before, v, ("shared",)):
+                    self.setupShared(screen, v)
+                    updated = True
+                if updated and self._running:
+                    self.updateRendering(screen)
+                if yoloChanged or _changed(before, v, FILTER_KEYS):
+                    filterLib, chain = self.buildFilterLib(screen, v)
+                    retiredFilters.append(self.filterLibs[name])
+                    self.filterLibs[name] = filterLib
+                    screen.callSoon(screen.setFilters, chain)
+                    updated = True
+                changes["updated"] += updated
+
+            logger.info(
+                "config reloaded: %s",
+                ", ".join(f"{count} {key}" for key, count in changes.items()),
+            )
+
+        if retiredScreens or retiredFilters:
+            threading.Thread(
+                target=self._retire,
+                args=(retiredScreens, retiredFilters),
+                name="retire",
+                daemon=True,
+            ).start()
+
+    def _retire(self, screens: list[Screen], filterLibs: list[FilterLib]) -> None:
+        for screen in screens:
+            screen.stopCapture(timeout=1.0)
+
+        # frames already queued are still filtered and written, close after them
+        deadline = perf_counter() + 2.0
+        sleep(0.1)
+        while (
+            self.pipeline is not None
+            and any(self.pipeline.queueDepths.values())
+            and perf_counter() < deadline
+        ):
+            sleep(0.05)
+
+        for screen in screens:
+            screen.close()
+        for filterLib in filterLibs:
+            filterLib.close()
+
+    def collectMetrics(self) -> list:
+        samples: list = list()
+        for screen in self.screens:
+            labels = {"screen": screen.name}
+            samples.extend(stageSamples(screen.stats, labels))
+            health = screen.health
+            for state in HEALTH_STATES:
+                stateLabels = {**labels, "state": state}
+                samples.append(("cms_screen_health", "", stateLabels, int(state == health)))
+            samples.append(("cms_reconnects_total", "", labels, screen.reconnects))
+            dropped = {**labels, "source": "capture"}
+            samples.append(("cms_dropped_frames_total", "", dropped, screen.droppedFrames))
+            recorder = screen.recorder
+            if recorder is not None:
+                dropped = {**labels, "source": "record"}
+                queue = {**labels, "queue": "record"}
+                samples.append(("cms_dropped_frames_total", "", dropped, recorder.dropped))
+                samples.append(("cms_queue_depth", "", queue, recorder.queueDepth))
+
+            filterLib = self.filterLibs.get(screen.name)
+            if filterLib is None:
+                continue
+            sink = filterLib.detectionSink
+            if sink is not None:
+                queue = {**labels, "queue": "detections"}
+                samples.append(("cms_queue_depth", "", queue, sink.pending))
+            yoloModel = filterLib.yoloModel
+            if yoloModel is None:
+                continue
+            samples.extend(stageSamples(yoloModel.stats, labels))
+            samples.append(("cms_inferences_total", "", labels, yoloModel.inferences))
+            samples.append(("cms_skipped_frames_total", "", labels, yoloModel.skipped))
+            trackStore = yoloModel.trackStore
+            samples.append(("cms_tracks", "", labels, trackStore.size))
+            for reason, count in (("expired", trackStore.expired), ("capped", trackStore.capped)):
+                evictions = {**labels, "reason": reason}
+                samples.append(("cms_track_evictions_total", "", evictions, count))
+            samples.append(("cms_stride", "", labels, yoloModel.stride))
+            motionGate = yoloModel.motionGate
+            if motionGate is not None:
+                samples.append(("cms_motion_gate_checks_total", "", labels, motionGate.checks))
+                samples.append(("cms_motion_gate_skips_total", "", labels, motionGate.skips))
+                samples.append(("cms_motion_gate_hit_rate", "", labels, motionGate.hitRate))
+
+        # batched inference and sinks are shared by every screen
+        shared = self.pipeline.stats if self.pipeline is not None else self.stats
+        samples.extend(stageSamples(shared, {"screen": "all"}))
+        if self.pipeline is not None:
+            for name, depth in self.pipeline.queueDepths.items():
+                queue = {"screen": "all", "queue": name}
+                samples.append(("cms_queue_depth", "", queue, depth))
+        for modelPath, latency in self.engine.latency.items():
+            labels = {"model": modelPath, "backend": latency["backend"]}
+            samples.append(
+                ("cms_inference_seconds_per_frame", "", labels, latency["msPerFrame"] / 1000)
+            )
+        return samples
+
+    def startMetrics(self) -> None:
+        metricsConfig: dict = self.configData.get("metrics", dict())
+        port: int = getDictV(metricsConfig, "port", default=0)
+        host: str = getDictV(metricsConfig, "host", default="127.0.0.1")
+        logInterval: float = getDictV(metricsConfig, "logInterval", default=0.0)
+
+        if port > 0 and self.metricsServer is None:
+            self.metricsServer = MetricsServer(self.metrics, host=host, port=port)
+            self.metricsServer.start()
+        if logInterval > 0 and self.metricsReporter is None:
+            self.metricsReporter = MetricsReporter(self.metrics, interval=logInterval)
+            self.metricsReporter.start()
+
+    def stopMetrics(self) -> None:
+        if self.metricsServer is not None:
+            self.metricsServer.close()
+            self.metricsServer = None
+        if self.metricsReporter is not None:
+            self.metricsReporter.close()
+            self.metricsReporter = None
+
+    def updateRendering(self, screen: Screen) -> None:
+        # headless with nothing taking the annotated frames: don't draw them
+        screen.renderAnnotations = (
+            self._display or bool(self.sinks) or screen.outputsFiltered
+        )
 
     def run(self, display=False):
+        self._running = True
+        self._display = display
+        for screen in self.screens:
+            self.updateRendering(screen)
+        self.startMetrics()
+
         if not display:
-            return 
+            self.pipeline = Pipeline(self.screens, self.filterLibs, self.engine)
+            for sink in self.sinks:
+                self.pipeline.addSink(sink)
+            self.pipeline.start()
+            return
 
-        self._running = True
         self.capture_thread.start()
         self.display_thread.start()
 
+    def stop(self):
+        self._running = False
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        self.stopMetrics()
+        self.resolver.close()
+
+    def join(self, timeout: float | None = None):
+        if self.pipeline is not None:
+            self.pipeline.join(timeout)
+            return
+
+        self.capture_thread.join(timeout)
+        self.display_thread.join(timeout)
+
     def captureThread(self):
+        for screen in self.screens:
+            screen.startCapture()
+
         while self._running:
-            for screen in self.screens:
-                screen.getNextFrame()
+            sleep(0.1)
 
         for screen in self.screens:
             screen.close()
+        for filterLib in self.filterLibs.values():
+            filterLib.close()
+        self.stopMetrics()
+        self.resolver.close()
 
         destroyAllWindows()
 
     def displayThread(self):
+        lastSeqs: dict[Screen, int] = dict()
         while self._running:
+            frames = list()
+            seqs: dict[Screen, int] = dict()
             for screen in self.screens:
-                screen.applyFilter()
+                # the loop outpaces capture, never filter or record a frame twice
+                seq = screen.frameRing.seq
+                seqs[screen] = seq
+                if lastSeqs.get(screen) == seq:
+                    continue
+                frame, timestamp, seqs[screen] = screen.latestFrame()
+                if frame is not None:
+                    frames.append((screen, frame, timestamp))
+            # keyed by screen object, reloaded screens start a fresh seq
+            lastSeqs = seqs
+
+            if frames:
+                # one batched forward pass for every screen using yolo
+                for screen, frame, _ in frames:
+                    filterLib = self.filterLibs.get(screen.name)
+                    yoloModel = filterLib.yoloModel if filterLib is not None else None
+                    if yoloModel is not None and yoloModel.scheduleInference(frame):
+                        self.engine.submit(yoloModel, frame)
+                beginTime = perf_counter()
+                self.engine.flush()
+                self.stats.record("infer", perf_counter() - beginTime)
+
+            for screen, frame, timestamp in frames:
+                screen.applyFilter(frame, timestamp)
+                screen.releaseFrame(frame)
                 screen.displayScreen(screen.name)
 
             if waitKey(1) & 0xFF == ord('q'):
@@ -0,0 +1,296 @@
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from logging import getLogger
+from multiprocessing import Manager
+from os import listdir
+from os.path import basename, isdir, join, splitext
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from time import perf_counter
+
+from cv2 import (
+    CAP_PROP_FPS,
+    CAP_PROP_FRAME_COUNT,
+    CAP_PROP_FRAME_HEIGHT,
+    CAP_PROP_FRAME_WIDTH,
+    CAP_PROP_POS_MSEC,
+    VideoCapture,
+    VideoWriter,
+    resize,
+)
+from cv2.typing import MatLike
+
+from libs.filterlib.engine import InferenceEngine
+from libs.filterlib.filter import FilterLib
+from libs.sinklib import DetectionSink
+from libs.utilslib import getDictV
+
+logger = getLogger(__name__)
+
+VIDEO_EXTENSIONS: tuple = (".mp4", ".avi", ".mkv", ".mov", ".m4v", ".ts", ".webm")
+
+# one engine per worker process, every video it handles reuses the loaded model
+_engine: InferenceEngine | None = None
+
+
+def collectVideos(inputs: list[str]) -> list[str]:
+    videos: list[str] = list()
+    for path in inputs:
+        if isdir(path):
+            videos.extend(
+                join(path, name)
+                for name in sorted(listdir(path))
+                if splitext(name)[1].lower() in VIDEO_EXTENSIONS
+            )
+        else:
+            videos.append(path)
+    return videos
+
+
+class VideoReader:
+    def __init__(self, path: str, scale: float = 1.0, readAhead: int = 64) -> None:
+        self._capture: VideoCapture = VideoCapture(path)
+        if not self._capture.isOpened():
+            raise ValueError(f"Video source {path} not found")
+
+        self._scale: float = scale
+        self._resolution: tuple[int, int] = (
+            int(self._capture.get(CAP_PROP_FRAME_WIDTH) * scale),
+            int(self._capture.get(CAP_PROP_FRAME_HEIGHT) * scale),
+        )
+        self._fps: float = self._capture.get(CAP_PROP_FPS) or 24.0
+        self._frameCount: int = int(self._capture.get(CAP_PROP_FRAME_COUNT))
+        self._queue: Queue = Queue(maxsize=readAhead)
+        self._stop: Event = Event()
+        self._thread: Thread = Thread(target=self._readLoop, daemon=True)
+
+    @property
+    def resolution(self) -> tuple[int, int]:
+        return self._resolution
+
+    @property
+    def fps(self) -> float:
+        return self._fps
+
+    @property
+    def frameCount(self) -> int:
+        return self._frameCount
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self) -> None:
+        # a failed file leaves the reader blocked on a full queue, make it let go
+        self._stop.set()
+        if not self._thread.is_alive():
+            self._capture.release()
+            return
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except Empty:
+                pass
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _readLoop(self) -> None:
+        # decode ahead of inference so the model never waits on the codec
+        while not self._stop.is_set():
+            ret, frame = self._capture.read()
+            if not ret:
+                break
+            if self._scale != 1.0:
+                frame = resize(frame, self._resolution)
+            if not self._put((frame, self._capture.get(CAP_PROP_POS_MSEC) / 1000)):
+                break
+
+        self._put(None)
+        self._capture.release()
+
+    def readBatch(self, size: int) -> list[tuple[MatLike, float]]:
+        batch: list = list()
+        while len(batch) < size:
+            item = self._queue.get()
+            if item is None:
+                # keep the end marker for the next call
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+
+def initWorker(configData: dict) -> None:
+    global _engine
+    _engine = InferenceEngine()
+    yoloConfig: dict | None = configData.get("yolo")
+    if yoloConfig:
+        # load and warm up once, before the first video is handed to this worker
+        _engine.preload(
+            yoloConfig["model"],
+            backend=getDictV(yoloConfig, "backend", "pytorch"),
+            imgsz=getDictV(yoloConfig, "imgsz", 640),
+            threads=getDictV(yoloConfig, "threads", 0),
+            warmup=getDictV(yoloConfig, "warmup", True),
+        ).join()
+
+
+def workerEngine() -> InferenceEngine:
+    global _engine
+    if _engine is None:
+        _engine = InferenceEngine()
+    return _engine
+
+
+def processVideo(
+    path: str,
+    configData: dict,
+    outputDir: str,
+    batchSize: int = 8,
+    writeVideo: bool = True,
+    writeRecords: bool = False,
+    progress=None,
+) -> dict:
+    offlineConfig: dict = configData.get("offline", dict())
+    scale: float = getDictV(offlineConfig, "scale", default=1.0)
+    fourcc: str = getDictV(offlineConfig, "fourcc", default="mp4v")
+    readAhead: int = getDictV(offlineConfig, "readAhead", default=64)
+
+    engine = workerEngine()
+    filterLib = FilterLib(configData.get("yolo"), engine=engine)
+    chain = filterLib.buildChain(offlineConfig.get("filter", dict()))
+    if not writeVideo:
+        # records only, nothing is drawn
+        chain = [func for func in chain if not getattr(func, "annotation", False)]
+    yoloModel = filterLib.yoloModel
+
+    reader = VideoReader(path, scale=scale, readAhead=readAhead)
+    stem = join(outputDir, splitext(basename(path))[0])
+    writer: VideoWriter | None = (
+        VideoWriter(
+            f"{stem}.annotated.mp4",
+            VideoWriter.fourcc(*fourcc),
+            reader.fps,
+            reader.resolution,
+        )
+        if writeVideo
+        else None
+    )
+    if writeRecords and yoloModel is not None:
+        sink = DetectionSink(f"{stem}.detections.jsonl")
+        filterLib.setDetectionSink(sink, basename(path))
+        chain.append(filterLib.recordDetections)
+
+    reader.start()
+    frameIndex = 0
+    beginTime = perf_counter()
+
+    try:
+        while batch := reader.readBatch(batchSize):
+            scheduled: list[int] = list()
+            if yoloModel is not None:
+                scheduled = [
+                    i
+                    for i, (frame, _) in enumerate(batch)
+                    if yoloModel.scheduleInference(frame)
+                ]
+            routed = dict(
+                zip(
+                    scheduled,
+                    engine.infer([(yoloModel, batch[i][0]) for i in scheduled]),
+                )
+            )
+
+            for i, (frame, timestamp) in enumerate(batch):
+                if i in routed:
+                    yoloModel.setResults(routed[i][1])
+
+                for func in chain:
+                    frame = func(frame, timestamp=timestamp)
+
+                if writer is not None:
+                    writer.write(frame)
+                frameIndex += 1
+
+            if progress is not None:
+                progress.put((path, frameIndex, reader.frameCount))
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.release()
+        filterLib.close()
+
+    elapsed = perf_counter() - beginTime
+    return {
+        "path": path,
+        "frames": frameIndex,
+        "seconds": elapsed,
+        "fps": frameIndex / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def runOffline(
+    videos: list[str],
+    configData: dict,
+    outputDir: str,
+    workers: int = 1,
+    batchSize: int = 8,
+    writeVideo: bool = True,
+    writeRecords: bool = False,
+    report=print,
+) -> list[dict]:
+    stats: list[dict] = list()
+    beginTime = perf_counter()
+
+    with Manager() as manager, ProcessPoolExecutor(
+        max_workers=workers, initializer=initWorker, initargs=(configData,)
+    ) as pool:
+        progress = manager.Queue()
+        futures: dict[Future, str] = {
+            pool.submit(
+                processVideo,
+                path,
+                configData,
+                outputDir,
+                batchSize,
+                writeVideo,
+                writeRecords,
+                progress,
+            ): path
+            for path in videos
+        }
+
+        done: dict[str, int] = dict()
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=0.5)
+            while not progress.empty():
+                path, frames, total = progress.get()
+                done[path] = frames
+                elapsed = perf_counter() - beginTime
+                report(
+                    f"[{basename(path)}] {frames}/{total or '?'} frames, "
+                    f"total {sum(done.values()) / elapsed:.1f} fps"
+                )
+
+        for future, path in futures.items():
+            try:
+                result = future.result()
+            except Exception as error:
+                # one broken file must not cost the rest of the run its summary
+                logger.exception("processing %s failed", path)
+                report(f"[{basename(path)}] failed: {error}")
+                stats.append({"path": path, "error": str(error)})
+                continue
+            report(
+                f"[{basename(result['path'])}] done {result['frames']} frames "
+                f"in {result['seconds']:.1f}s ({result['fps']:.1f} fps)"
+            )
+            stats.append(result)
+
+    return stats
@@ -0,0 +1,202 @@
+from logging import getLogger
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+from time import perf_counter
+from typing import Callable
+
+from libs.filterlib.engine import InferenceEngine
+from libs.filterlib.filter import FilterLib
+from libs.metricslib.stats import StageStats
+from libs.screenlib.screen import Screen
+
+logger = getLogger(__name__)
+
+class Pipeline:
+    def __init__(
+        self,
+        screens: list[Screen],
+        filterLibs: dict[str, FilterLib],
+        engine: InferenceEngine,
+        queueSize: int = 4,
+        pollInterval: float = 0.005,
+    ) -> None:
+        self._screens: list[Screen] = screens
+        self._filterLibs: dict[str, FilterLib] = filterLibs
+        self._engine: InferenceEngine = engine
+        self._pollInterval: float = pollInterval
+        self._sinks: list[Callable] = list()
+        self._stopEvent: Event = Event()
+        self._lastSeqs: dict[str, int] = dict()
+        self._stats: StageStats = StageStats()
+
+        self._inferQueue: Queue = Queue(maxsize=queueSize)
+        self._annotateQueue: Queue = Queue(maxsize=queueSize)
+        self._sinkQueue: Queue = Queue(maxsize=queueSize)
+
+        self._threads: list[Thread] = [
+            Thread(target=self._collectStage, name="pipeline-collect", daemon=True),
+            Thread(target=self._inferStage, name="pipeline-infer", daemon=True),
+            Thread(target=self._annotateStage, name="pipeline-annotate", daemon=True),
+            Thread(target=self._sinkStage, name="pipeline-sink", daemon=True),
+        ]
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def stats(self) -> StageStats:
+        return self._stats
+
+    @property
+    def queueDepths(self) -> dict[str, int]:
+        return {
+            "infer": self._inferQueue.qsize(),
+            "annotate": self._annotateQueue.qsize(),
+            "sink": self._sinkQueue.qsize(),
+        }
+
+    def _yoloModel(self, screen: Screen):
+        # a reload can drop a screen while its frames are still queued
+        filterLib = self._filterLibs.get(screen.name)
+        return filterLib.yoloModel if filterLib is not None else None
+
+    def addSink(self, sink: Callable) -> None:
+        self._sinks.append(sink)
+
+    def start(self) -> None:
+        for screen in self._screens:
+            screen.startCapture()
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stopEvent.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _put(self, queue: Queue, item) -> bool:
+        # block while downstream is full, but keep an eye on shutdown
+        while not self._stopEvent.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _putSentinel(self, queue: Queue) -> None:
+        # the sentinel must get through, on stop make room by dropping queued work
+        while True:
+            try:
+                queue.put(None, timeout=0.1)
+                return
+            except Full:
+                if self._stopEvent.is_set():
+                    try:
+                        queue.get_nowait()
+                    except Empty:
+                        pass
+
+    def _get(self, queue: Queue):
+        while True:
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+
+    def _collectStage(self) -> None:
+        while not self._stopEvent.is_set():
+            batch: list = list()
+            for screen in self._screens:
+                # skip the copy when the screen has nothing new
+                if self._lastSeqs.get(screen.name) == screen.frameRing.seq:
+                    continue
+                try:
+                    frame, timestamp, seq = screen.latestFrame()
+                except Exception:
+                    logger.exception("collect failed on screen %s", screen.name)
+                    continue
+                if frame is None:
+                    continue
+                self._lastSeqs[screen.name] = seq
+                batch.append((screen, frame, timestamp))
+
+            if not batch:
+                self._stopEvent.wait(self._pollInterval)
+                continue
+
+            if not self._put(self._inferQueue, batch):
+                for screen, frame, _ in batch:
+                    screen.releaseFrame(frame)
+
+        # sentinel walks down the stages so every queue is drained before exit
+        self._putSentinel(self._inferQueue)
+
+    def _inferStage(self) -> None:
+        while (batch := self._get(self._inferQueue)) is not None:
+            try:
+                items: list = list()
+                for screen, frame, _ in batch:
+                    yoloModel = self._yoloModel(screen)
+                    if yoloModel is not None and yoloModel.scheduleInference(frame):
+                        items.append((yoloModel, frame))
+
+                beginTime = perf_counter()
+                routed = dict(
+                    (id(decoder), results)
+                    for decoder, results in self._engine.infer(items)
+                )
+                if items:
+                    self._stats.record("infer", perf_counter() - beginTime)
+            except Exception:
+                logger.exception("inference failed, batch passed on without results")
+                routed = dict()
+            for screen, frame, timestamp in batch:
+                yoloModel = self._yoloModel(screen)
+                results = routed.get(id(yoloModel)) if yoloModel is not None else None
+                if not self._put(self._annotateQueue, (screen, frame, timestamp, results)):
+                    screen.releaseFrame(frame)
+
+        self._putSentinel(self._annotateQueue)
+
+    def _annotateStage(self) -> None:
+        while (item := self._get(self._annotateQueue)) is not None:
+            screen, frame, timestamp, results = item
+            try:
+                yoloModel = self._yoloModel(screen)
+                if yoloModel is not None and results is not None:
+                    yoloModel.setResults(results)
+                screen.applyFilter(frame, timestamp)
+            except Exception:
+                logger.exception("annotate failed on screen %s", screen.name)
+                continue
+            finally:
+                screen.releaseFrame(frame)
+            # the next frame replaces the screen's buffer, sinks keep their own reference
+            buffer = screen.retainFilterScreenBuffer()
+            if not self._put(self._sinkQueue, (screen, buffer, timestamp)):
+                screen.releaseFrame(buffer)
+
+        self._putSentinel(self._sinkQueue)
+
+    def _sinkStage(self) -> None:
+        while (item := self._get(self._sinkQueue)) is not None:
+            screen, frame, timestamp = item
+            for sink in self._sinks:
+                name = getattr(sink, "__name__", type(sink).__name__)
+                beginTime = perf_counter()
+                try:
+                    sink(screen, frame, timestamp)
+                except Exception:
+                    logger.exception("sink %s failed on screen %s", name, screen.name)
+                    continue
+                self._stats.record(f"sink:{name}", perf_counter() - beginTime)
+            screen.releaseFrame(frame)
+
+        for screen in self._screens:
+            screen.close()
+        for filterLib in self._filterLibs.values():
+            filterLib.close()
@@ -0,0 +1,169 @@
+from logging import getLogger
+from multiprocessing import Event, Process, Queue
+from queue import Empty
+from time import sleep
+
+from cv2 import destroyAllWindows, imshow, waitKey
+from cv2.typing import MatLike
+
+from libs.screenlib.screen import Screen
+from libs.screenlib.shmring import SharedFrameRing
+
+logger = getLogger(__name__)
+
+
+def partitionScreens(configData: dict, workers: int) -> list[dict]:
+    if workers <= 0:
+        raise ValueError("workers must be greater than 0")
+
+    names = list(configData["screens"])
+    shards: list[dict] = list()
+    for index in range(min(workers, len(names))):
+        # round robin keeps heavy and light cameras spread out when listed in order
+        screens = {name: configData["screens"][name] for name in names[index::workers]}
+        shard = {**configData, "screens": screens}
+        metrics: dict = configData.get("metrics", dict())
+        if metrics.get("port", 0) > 0:
+            # every worker serves its own screens, on consecutive ports
+            shard["metrics"] = {**metrics, "port": metrics["port"] + index}
+        shards.append(shard)
+    return shards
+
+
+class FramePublisher:
+    def __init__(self, shardIndex: int, events: Queue, capacity: int = 3) -> None:
+        self._shardIndex: int = shardIndex
+        self._events: Queue = events
+        self._capacity: int = capacity
+        self._rings: dict[str, SharedFrameRing] = dict()
+        self._generations: dict[str, int] = dict()
+
+    def _ring(self, screen: Screen, frame: MatLike) -> SharedFrameRing:
+        ring = self._rings.get(screen.name)
+        if ring is not None and ring.shape == frame.shape:
+            return ring
+
+        # first frame, or the screen changed size: publish a fresh block
+        if ring is not None:
+            ring.close()
+        generation = self._generations.get(screen.name, -1) + 1
+        self._generations[screen.name] = generation
+        ring = SharedFrameRing.create(
+            f"cms-{self._shardIndex}-{screen.name}-{generation}",
+            frame.shape,
+            self._capacity,
+        )
+        self._rings[screen.name] = ring
+        self._events.put(("ring", screen.name, ring.name))
+        return ring
+
+    def __call__(self, screen: Screen, frame: MatLike, timestamp: float) -> None:
+        self._ring(screen, frame).write(frame, timestamp)
+
+    def close(self) -> None:
+        for ring in self._rings.values():
+            ring.close()
+        self._rings.clear()
+
+
+def shardWorker(index: int, configData: dict, events: Queue, stopEvent) -> None:
+    from .app import App
+
+    app = App(configData)
+    publisher = FramePublisher(index, events)
+    app.addSink(publisher)
+    app.run(display=False)
+    events.put(("ready", index, list(configData["screens"])))
+
+    try:
+        while not stopEvent.is_set() and app.running:
+            stopEvent.wait(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.stop()
+        app.join()
+        publisher.close()
+        events.put(("exit", index, None))
+
+
+class ShardCoordinator:
+    def __init__(self, configData: dict, workers: int) -> None:
+        self._shards: list[dict] = partitionScreens(configData, workers)
+        self._events: Queue = Queue()
+        self._stopEvent = Event()
+        self._rings: dict[str, SharedFrameRing] = dict()
+        self._processes: list[Process] = [
+            Process(
+                target=shardWorker,
+                args=(index, shard, self._events, self._stopEvent),
+                name=f"shard-{index}",
+            )
+            for index, shard in enumerate(self._shards)
+        ]
+
+    @property
+    def running(self) -> bool:
+        return any(process.is_alive() for process in self._processes)
+
+    @property
+    def rings(self) -> dict[str, SharedFrameRing]:
+        return self._rings
+
+    def start(self) -> None:
+        for process in self._processes:
+            process.start()
+
+    def stop(self) -> None:
+        self._stopEvent.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        for process in self._processes:
+            process.join(timeout)
+
+    def pollEvents(self) -> None:
+        while True:
+            try:
+                kind, key, value = self._events.get_nowait()
+            except Empty:
+                return
+
+            if kind == "ring":
+                old = self._rings.pop(key, None)
+                if old is not None:
+                    old.close()
+                try:
+                    self._rings[key] = SharedFrameRing.attach(value)
+                except FileNotFoundError:
+                    # the shard already replaced or dropped this block
+                    continue
+            elif kind == "ready":
+                logger.info("shard %d running screens %s", key, ", ".join(value))
+            elif kind == "exit":
+                logger.info("shard %d stopped", key)
+
+    def latestFrames(self) -> dict[str, tuple[MatLike | None, float, int]]:
+        self.pollEvents()
+        return {name: ring.latest() for name, ring in self._rings.items()}
+
+    def display(self) -> None:
+        while self.running:
+            for name, (frame, _, _) in self.latestFrames().items():
+                if frame is not None:
+                    imshow(name, frame)
+
+            if waitKey(1) & 0xFF == ord("q"):
+                break
+        self.stop()
+        destroyAllWindows()
+
+    def wait(self) -> None:
+        while self.running:
+            self.pollEvents()
+            sleep(0.5)
+
+    def close(self) -> None:
+        self.pollEvents()
+        for ring in self._rings.values():
+            ring.close()
+        self._rings.clear()
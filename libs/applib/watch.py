@@ -0,0 +1,65 @@
+from logging import getLogger
+from os.path import getmtime
+from threading import Event, Thread
+from typing import Callable
+
+logger = getLogger(__name__)
+
+
+class ConfigWatcher:
+    def __init__(
+        self,
+        path: str,
+        load: Callable[[str], dict],
+        onChange: Callable[[dict], None],
+        interval: float = 1.0,
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0")
+
+        self._path: str = path
+        self._load: Callable[[str], dict] = load
+        self._onChange: Callable[[dict], None] = onChange
+        self._interval: float = interval
+        self._mtime: float = self._readMtime()
+        self._stopEvent: Event = Event()
+        self._triggered: Event = Event()
+        self._thread: Thread = Thread(target=self._loop, name="config-watch", daemon=True)
+
+    def _readMtime(self) -> float:
+        try:
+            return getmtime(self._path)
+        except OSError:
+            return 0.0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def trigger(self) -> None:
+        # reload on the next poll even if the file looks unchanged, e.g. SIGHUP
+        self._triggered.set()
+
+    def _loop(self) -> None:
+        while not self._stopEvent.wait(self._interval):
+            mtime = self._readMtime()
+            if mtime == self._mtime and not self._triggered.is_set():
+                continue
+            self._mtime = mtime
+            self._triggered.clear()
+
+            try:
+                configData = self._load(self._path)
+            except Exception:
+                # half-saved or broken file, keep running on the current config
+                logger.exception("config %s not reloaded", self._path)
+                continue
+
+            try:
+                self._onChange(configData)
+            except Exception:
+                logger.exception("applying config %s failed", self._path)
+
+    def close(self) -> None:
+        self._stopEvent.set()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,2 @@
+from .harness import StageTimer
+from .suite import compareReports, loadReport, runCase, runSuite, saveReport
@@ -0,0 +1,52 @@
+from time import perf_counter_ns
+from tracemalloc import get_traced_memory, reset_peak
+from typing import Callable
+
+from numpy import array, float64, mean, percentile
+
+
+class StageTimer:
+    def __init__(self, name: str) -> None:
+        self._name: str = name
+        self._samples: list[int] = list()
+        self._allocations: list[int] = list()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def time(self, func: Callable, *args, **kwargs):
+        beginTime = perf_counter_ns()
+        result = func(*args, **kwargs)
+        self._samples.append(perf_counter_ns() - beginTime)
+        return result
+
+    def trace(self, func: Callable, *args, **kwargs):
+        # peak python/numpy memory above the starting point, tracemalloc must be on
+        before, _ = get_traced_memory()
+        reset_peak()
+        result = func(*args, **kwargs)
+        _, peak = get_traced_memory()
+        self._allocations.append(max(peak - before, 0))
+        return result
+
+    def summary(self) -> dict:
+        if not self._samples:
+            return {"stage": self._name, "iterations": 0}
+
+        samples = array(self._samples, dtype=float64) / 1e6
+        meanMs = float(mean(samples))
+        p50, p90, p99 = percentile(samples, [50, 90, 99])
+        allocations = self._allocations or [0]
+        return {
+            "stage": self._name,
+            "iterations": len(samples),
+            "meanMs": round(meanMs, 4),
+            "p50Ms": round(float(p50), 4),
+            "p90Ms": round(float(p90), 4),
+            "p99Ms": round(float(p99), 4),
+            "maxMs": round(float(samples.max()), 4),
+            "perSecond": round(1000 / meanMs, 1) if meanMs > 0 else 0.0,
+            "allocPeakBytes": int(mean(allocations)),
+            "allocPeakMaxBytes": int(max(allocations)),
+        }
@@ -0,0 +1,216 @@
+from json import dump, load
+from logging import getLogger
+from os.path import join
+from platform import platform, python_version
+from tempfile import TemporaryDirectory
+from time import time
+from tracemalloc import start as startTracing, stop as stopTracing
+
+from cv2 import __version__ as cvVersion
+from numpy import __version__ as npVersion, copyto, empty_like
+
+from libs.filterlib.filter import FilterLib
+from libs.screenlib.screen import Screen
+from .harness import StageTimer
+from .synthetic import (
+    SyntheticEngine,
+    SyntheticTracks,
+    syntheticFrame,
+    writeSyntheticVideo,
+)
+
+logger = getLogger(__name__)
+
+DEFAULT_RESOLUTIONS: list[tuple[int, int]] = [(640, 360), (1280, 720), (1920, 1080)]
+DEFAULT_TRACKS: list[int] = [10, 100, 500]
+FILTER_CONFIG: dict = {"trailBalls": {"index": 0}, "stopBoxes": {"index": 1}}
+
+
+def _yoloConfig(tracks: int) -> dict:
+    return {"model": "synthetic.pt", "persist": True, "maxTracks": tracks}
+
+
+def _hasQt() -> bool:
+    try:
+        import PySide6.QtGui  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def runCase(
+    width: int,
+    height: int,
+    tracks: int,
+    iterations: int = 200,
+    warmup: int = 20,
+    allocIterations: int = 20,
+    fps: float = 30.0,
+    workDir: str = ".",
+) -> list[dict]:
+    engine = SyntheticEngine()
+    source = syntheticFrame(width, height)
+    frame = empty_like(source)
+
+    # stage benchmarks call the track/draw methods directly on one instance
+    stages = FilterLib(_yoloConfig(tracks), engine=engine)
+    stages.buildChain(FILTER_CONFIG)
+    yoloModel = stages.yoloModel
+    stream = SyntheticTracks(tracks, width, height)
+
+    # the screen runs the full configured chain, tracker included
+    screen = Screen(
+        writeSyntheticVideo(join(workDir, f"{width}x{height}.avi"), width, height),
+        "bench",
+        clock="stream",
+    )
+    screenFilters = FilterLib(_yoloConfig(tracks), engine=engine)
+    for func in screenFilters.buildChain(FILTER_CONFIG):
+        screen.addFilter(func)
+    screenModel = screenFilters.yoloModel
+    screenStream = SyntheticTracks(tracks, width, height, seed=1)
+
+    timers = {
+        name: StageTimer(name)
+        for name in ("persist", "trailBalls", "stopBoxes", "applyFilter", "getQImage")
+    }
+    qt = _hasQt()
+    if not qt:
+        logger.warning("PySide6 not installed, skipping getQImage")
+
+    def iterate(index: int, measure) -> None:
+        timestamp = index / fps
+        results = stream.step(source)
+        yoloModel._frameTime = timestamp
+        measure(timers["persist"], yoloModel._persistAdditionalHandle, results)
+
+        copyto(frame, source)
+        measure(timers["trailBalls"], yoloModel.trailBalls, frame, timestamp)
+        copyto(frame, source)
+        measure(timers["stopBoxes"], yoloModel.stopBoxes, frame, timestamp)
+
+        copyto(frame, source)
+        screenModel.setResults(screenStream.step(source))
+        measure(timers["applyFilter"], screen.applyFilter, frame, timestamp)
+        if qt:
+            measure(timers["getQImage"], screen.getQImage, False)
+
+    try:
+        index = 0
+        for _ in range(warmup):
+            iterate(index, lambda timer, func, *args: func(*args))
+            index += 1
+        for _ in range(iterations):
+            iterate(index, lambda timer, func, *args: timer.time(func, *args))
+            index += 1
+
+        # allocation pass is separate, tracing slows every call down
+        startTracing()
+        try:
+            for _ in range(allocIterations):
+                iterate(index, lambda timer, func, *args: timer.trace(func, *args))
+                index += 1
+        finally:
+            stopTracing()
+    finally:
+        screen.close()
+
+    summaries: list[dict] = list()
+    for timer in timers.values():
+        summary = timer.summary()
+        if summary["iterations"] == 0:
+            continue
+        summary.update(width=width, height=height, tracks=tracks)
+        summary["megapixelsPerSecond"] = round(
+            summary["perSecond"] * width * height / 1e6, 1
+        )
+        summaries.append(summary)
+    return summaries
+
+
+def runSuite(
+    resolutions: list[tuple[int, int]] = DEFAULT_RESOLUTIONS,
+    trackCounts: list[int] = DEFAULT_TRACKS,
+    iterations: int = 200,
+    warmup: int = 20,
+    allocIterations: int = 20,
+) -> dict:
+    results: list[dict] = list()
+    with TemporaryDirectory(prefix="bench-") as workDir:
+        for width, height in resolutions:
+            for tracks in trackCounts:
+                logger.info("bench %dx%d, %d tracks", width, height, tracks)
+                results.extend(
+                    runCase(
+                        width,
+                        height,
+                        tracks,
+                        iterations=iterations,
+                        warmup=warmup,
+                        allocIterations=allocIterations,
+                        workDir=workDir,
+                    )
+                )
+
+    return {
+        "meta": {
+            "time": time(),
+            "python": python_version(),
+            "numpy": npVersion,
+            "opencv": cvVersion,
+            "platform": platform(),
+            "iterations": iterations,
+            "warmup": warmup,
+        },
+        "results": results,
+    }
+
+
+def _caseKey(result: dict) -> tuple:
+    return (result["stage"], result["width"], result["height"], result["tracks"])
+
+
+def saveReport(report: dict, output: str) -> None:
+    with open(output, "w") as file:
+        dump(report, file, indent=2)
+
+
+def loadReport(path: str) -> dict:
+    with open(path) as file:
+        return load(file)
+
+
+def compareReports(baseline: dict, current: dict) -> list[dict]:
+    before = {_caseKey(result): result for result in baseline["results"]}
+    rows: list[dict] = list()
+    for result in current["results"]:
+        old = before.get(_caseKey(result))
+        if old is None or not old["p50Ms"]:
+            continue
+        rows.append(
+            {
+                "stage": result["stage"],
+                "width": result["width"],
+                "height": result["height"],
+                "tracks": result["tracks"],
+                "baselineP50Ms": old["p50Ms"],
+                "p50Ms": result["p50Ms"],
+                "ratio": round(result["p50Ms"] / old["p50Ms"], 3),
+            }
+        )
+    return rows
+
+
+def formatTable(rows: list[dict], columns: list[str]) -> str:
+    if not rows:
+        return ""
+
+    widths = [
+        max(len(column), *(len(str(row[column])) for row in rows)) for column in columns
+    ]
+    lines = [[column for column in columns]]
+    lines.extend([str(row[column]) for column in columns] for row in rows)
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(line, widths))
+        for line in lines
+    )
@@ -0,0 +1,76 @@
+from cv2 import VideoWriter
+from cv2.typing import MatLike
+from numpy import arange, clip, column_stack, float32, full, uint8, zeros
+from numpy.random import default_rng
+from torch import as_tensor
+from ultralytics.engine.results import Results
+
+from libs.filterlib.engine import InferenceEngine
+
+
+class SyntheticEngine(InferenceEngine):
+    # stands in for the model so tracking and drawing run without weights
+    def getModel(self, modelPath: str) -> None:
+        return None
+
+
+def syntheticFrame(width: int, height: int, seed: int = 0) -> MatLike:
+    return default_rng(seed).integers(0, 256, (height, width, 3), dtype=uint8)
+
+
+def writeSyntheticVideo(path: str, width: int, height: int, frames: int = 5) -> str:
+    writer = VideoWriter(path, VideoWriter.fourcc(*"MJPG"), 30, (width, height))
+    for index in range(frames):
+        writer.write(syntheticFrame(width, height, seed=index))
+    writer.release()
+    return path
+
+
+class SyntheticTracks:
+    def __init__(
+        self,
+        count: int,
+        width: int,
+        height: int,
+        stoppedRatio: float = 0.5,
+        boxSize: int = 24,
+        seed: int = 0,
+    ) -> None:
+        if count <= 0:
+            raise ValueError("count must be greater than 0")
+
+        rng = default_rng(seed)
+        half = boxSize / 2
+        self._low = (half, half)
+        self._high = (width - half, height - half)
+        self._half: float = half
+        self._centers = rng.uniform(self._low, self._high, (count, 2))
+        # the first part of the tracks stand still so stop detection has work to do
+        self._velocities = rng.uniform(-6, 6, (count, 2))
+        self._velocities[: int(count * stoppedRatio)] = 0
+        self._ids = arange(1, count + 1, dtype=float32)
+        self._conf = full(count, 0.9, dtype=float32)
+        self._cls = zeros(count, dtype=float32)
+        self._names: dict = {0: "ball"}
+
+    @property
+    def count(self) -> int:
+        return len(self._ids)
+
+    def step(self, frame: MatLike) -> list:
+        self._centers += self._velocities
+        # bounce off the frame edges
+        out = (self._centers < self._low) | (self._centers > self._high)
+        self._velocities[out] *= -1
+        self._centers = clip(self._centers, self._low, self._high)
+
+        data = column_stack(
+            [
+                self._centers - self._half,
+                self._centers + self._half,
+                self._ids,
+                self._conf,
+                self._cls,
+            ]
+        ).astype(float32)
+        return [Results(frame, path="synthetic", names=self._names, boxes=as_tensor(data))]
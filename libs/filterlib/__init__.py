@@ -1,2 +1,16 @@
 from .filter import FilterLib
-from .yololib import YoloDecLib
+from .motion import MotionGate
+from .roi import RegionOfInterest
+
+
+def __getattr__(name: str):
+    # YoloDecLib imports ultralytics/torch, load it only when asked for
+    if name == "YoloDecLib":
+        from .yololib import YoloDecLib
+
+        return YoloDecLib
+    if name == "InferenceEngine":
+        from .engine import InferenceEngine
+
+        return InferenceEngine
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
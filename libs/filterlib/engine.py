@@ -0,0 +1,237 @@
+from collections import defaultdict
+from logging import getLogger
+from os.path import exists, splitext
+from threading import Lock, Thread
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from cv2.typing import MatLike
+from numpy import zeros, uint8
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+logger = getLogger(__name__)
+
+BACKENDS: tuple = ("pytorch", "onnx", "openvino")
+
+
+def exportedPath(modelPath: str, backend: str) -> str:
+    stem, _ = splitext(modelPath)
+    if backend == "onnx":
+        return f"{stem}.onnx"
+    if backend == "openvino":
+        return f"{stem}_openvino_model"
+    return modelPath
+
+
+def createTracker(trackerConfig: str, frameRate: int = 30):
+    # ultralytics pulls in torch, only pay for it once tracking is configured
+    from ultralytics.trackers.bot_sort import BOTSORT
+    from ultralytics.trackers.byte_tracker import BYTETracker
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+
+    trackerMap: dict = {"bytetrack": BYTETracker, "botsort": BOTSORT}
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(trackerConfig)))
+    if cfg.tracker_type not in trackerMap:
+        raise ValueError(
+            f"Only support 'bytetrack' and 'botsort' for now, but got '{cfg.tracker_type}'"
+        )
+    return trackerMap[cfg.tracker_type](args=cfg, frame_rate=frameRate)
+
+
+class InferenceEngine:
+    def __init__(self) -> None:
+        self._models: dict[str, "YOLO"] = dict()
+        self._modelLock: Lock = Lock()
+        self._inferLock: Lock = Lock()
+        self._queue: list = list()
+        self._resolved: dict[tuple[str, str], str] = dict()
+        self._backends: dict[str, str] = dict()
+        self._imgsz: dict[str, int] = dict()
+        # model path -> [calls, frames, seconds]
+        self._latency: dict[str, list] = defaultdict(lambda: [0, 0, 0.0])
+        self._latencyLogInterval: float = 60.0
+        self._lastLatencyLog: float = perf_counter()
+
+    @property
+    def models(self) -> dict[str, "YOLO"]:
+        return self._models
+
+    @property
+    def latency(self) -> dict[str, dict]:
+        return {
+            modelPath: {
+                "backend": self._backends.get(modelPath, "pytorch"),
+                "calls": calls,
+                "frames": frames,
+                "msPerCall": seconds * 1000 / calls if calls else 0.0,
+                "msPerFrame": seconds * 1000 / frames if frames else 0.0,
+            }
+            for modelPath, (calls, frames, seconds) in self._latency.items()
+        }
+
+    def _setThreads(self, threads: int, backend: str) -> None:
+        if threads <= 0:
+            return
+        if backend != "pytorch":
+            # ultralytics builds the onnxruntime session and openvino model
+            # without thread options, only torch pre/post-processing is bounded
+            logger.warning(
+                "threads only applies to the pytorch backend, %s picks its own", backend
+            )
+        from torch import set_num_threads
+
+        set_num_threads(threads)
+
+    def resolveModel(
+        self, modelPath: str, backend: str = "pytorch", imgsz: int = 640, threads: int = 0
+    ) -> str:
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, receive '{backend}'")
+
+        with self._modelLock:
+            key = (modelPath, backend)
+            if key in self._resolved:
+                return self._resolved[key]
+
+            self._setThreads(threads, backend)
+            path = modelPath
+            if backend != "pytorch" and modelPath.endswith(".pt"):
+                # export once next to the weights, later starts reuse the file
+                path = exportedPath(modelPath, backend)
+                if not exists(path):
+                    from ultralytics import YOLO
+
+                    beginTime = perf_counter()
+                    path = YOLO(modelPath).export(
+                        format=backend, imgsz=imgsz, dynamic=True
+                    )
+                    logger.info(
+                        "exported %s to %s in %.2fs",
+                        modelPath,
+                        path,
+                        perf_counter() - beginTime,
+                    )
+
+            self._resolved[key] = path
+            self._backends[path] = backend
+            self._imgsz[path] = imgsz
+            return path
+
+    def getModel(self, modelPath: str) -> "YOLO":
+        # load every weight file once, no matter how many screens use it
+        model = self._models.get(modelPath)
+        if model is not None:
+            return model
+        with self._modelLock:
+            if modelPath not in self._models:
+                from ultralytics import YOLO
+
+                self._models[modelPath] = YOLO(modelPath)
+            return self._models[modelPath]
+
+    def warmup(self, modelPath: str, runs: int = 2) -> None:
+        # first calls pay for graph setup, do it before any screen needs a result
+        imgsz = self._imgsz.get(modelPath, 640)
+        frame = zeros((imgsz, imgsz, 3), dtype=uint8)
+        for _ in range(runs):
+            self.predict(modelPath, [frame], conf=0.25, classes=None, record=False)
+
+    def _load(
+        self, modelPath: str, backend: str, imgsz: int, threads: int, warmup: bool
+    ) -> None:
+        beginTime = perf_counter()
+        path = self.resolveModel(modelPath, backend, imgsz, threads)
+        self.getModel(path)
+        loadTime = perf_counter()
+        if warmup:
+            self.warmup(path)
+        logger.info(
+            "model %s (%s) loaded in %.2fs, warm-up %.2fs",
+            path,
+            backend,
+            loadTime - beginTime,
+            perf_counter() - loadTime,
+        )
+
+    def preload(
+        self,
+        modelPath: str,
+        backend: str = "pytorch",
+        imgsz: int = 640,
+        threads: int = 0,
+        warmup: bool = True,
+    ) -> Thread:
+        thread = Thread(
+            target=self._load,
+            args=(modelPath, backend, imgsz, threads, warmup),
+            name="model-load",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _recordLatency(self, modelPath: str, frames: int, seconds: float) -> None:
+        stats = self._latency[modelPath]
+        stats[0] += 1
+        stats[1] += frames
+        stats[2] += seconds
+
+        if perf_counter() - self._lastLatencyLog < self._latencyLogInterval:
+            return
+        self._lastLatencyLog = perf_counter()
+        for path, latency in self.latency.items():
+            logger.info(
+                "model %s (%s): %.1f ms/call, %.1f ms/frame over %d frames",
+                path,
+                latency["backend"],
+                latency["msPerCall"],
+                latency["msPerFrame"],
+                latency["frames"],
+            )
+
+    def predict(
+        self,
+        modelPath: str,
+        frames: list[MatLike],
+        conf: float,
+        classes: list | None,
+        record: bool = True,
+    ) -> list:
+        model = self.getModel(modelPath)
+        with self._inferLock:
+            beginTime = perf_counter()
+            results = model.predict(
+                source=frames,
+                verbose=False,
+                conf=conf,
+                classes=classes,
+                imgsz=self._imgsz.get(modelPath, 640),
+            )
+            if record:
+                self._recordLatency(modelPath, len(frames), perf_counter() - beginTime)
+            return results
+
+    def submit(self, decoder, frame: MatLike) -> None:
+        self._queue.append((decoder, frame))
+
+    def infer(self, items: list) -> list:
+        # screens sharing model and predict arguments go into one forward pass
+        groups: dict = defaultdict(list)
+        for decoder, frame in items:
+            groups[decoder.batchKey].append((decoder, frame))
+
+        routed: list = list()
+        for (modelPath, conf, classes), group in groups.items():
+            frames = [decoder.prepareInput(frame) for decoder, frame in group]
+            results = self.predict(modelPath, frames, conf, list(classes))
+            for (decoder, _), result in zip(group, results):
+                routed.append((decoder, [result]))
+        return routed
+
+    def flush(self) -> None:
+        queue, self._queue = self._queue, list()
+        for decoder, results in self.infer(queue):
+            decoder.setResults(results)
@@ -1,27 +1,68 @@
-from .yololib import YoloDecLib
-from libs.utilslib import getDictV
+from .engine import InferenceEngine
+from libs.sinklib import DetectionSink
+from libs.utilslib import getDictV, drawsInPlace, drawsAnnotation
 from time import time
 from cv2.typing import MatLike
+from typing import Callable, TYPE_CHECKING
 from cv2 import putText, FONT_HERSHEY_SIMPLEX
 
+if TYPE_CHECKING:
+    from .yololib import YoloDecLib
+
 
 class FilterLib:
-    def __init__(self, yoloConfig: dict | None = None) -> None:
-        self._yoloModel: YoloDecLib | None = self.setYoloConfig(yoloConfig)
-        self._lastUpdateTime: float = time()
+    def __init__(
+        self, yoloConfig: dict | None = None, engine: InferenceEngine | None = None
+    ) -> None:
+        self._engine: InferenceEngine | None = engine
+        self._detectionSink: DetectionSink | None = None
+        self._sinkName: str = ""
+        self._recordedFrames: int = 0
+        self._yoloModel: "YoloDecLib | None" = self.setYoloConfig(yoloConfig)
+        self._lastUpdateTime: float | None = None
+        self._fps: float = 0.0
+        self._disabled: set[str] = set()
 
     @property
-    def yoloModel(self) -> YoloDecLib | None:
+    def yoloModel(self) -> "YoloDecLib | None":
         return self._yoloModel
 
-    def setYoloConfig(self, yoloConfig: dict | None) -> YoloDecLib | None:
+    @property
+    def detectionSink(self) -> DetectionSink | None:
+        return self._detectionSink
+
+    def setDetectionSink(self, sink: DetectionSink | None, name: str = "") -> None:
+        self._detectionSink = sink
+        self._sinkName = name
+
+    def filterEnabled(self, name: str) -> bool:
+        return name not in self._disabled
+
+    def setFilterEnabled(self, name: str, enabled: bool) -> None:
+        if enabled:
+            self._disabled.discard(name)
+        else:
+            self._disabled.add(name)
+
+    def setYoloConfig(self, yoloConfig: dict | None) -> "YoloDecLib | None":
         if yoloConfig is None:
             return None
 
+        from .yololib import YoloDecLib
+
         conf: float = getDictV(yoloConfig, "conf", 0.7)
         persist: bool = getDictV(yoloConfig, "persist", False)
         classes: list = getDictV(yoloConfig, "classes", [0])
         tracker: str = getDictV(yoloConfig, "tracker", "bytetrack.yaml")
+        trackMaxAge: int = getDictV(yoloConfig, "trackMaxAge", 0)
+        trackMaxAgeSec: float = getDictV(yoloConfig, "trackMaxAgeSec", 0.0)
+        maxTracks: int = getDictV(yoloConfig, "maxTracks", 1000)
+        backend: str = getDictV(yoloConfig, "backend", "pytorch")
+        imgsz: int = getDictV(yoloConfig, "imgsz", 640)
+        threads: int = getDictV(yoloConfig, "threads", 0)
+        stride: int = getDictV(yoloConfig, "stride", 1)
+        adaptive: bool = getDictV(yoloConfig, "adaptive", False)
+        maxStride: int = getDictV(yoloConfig, "maxStride", max(stride, 8))
 
         self._yoloModel = YoloDecLib(
             modelPath=yoloConfig["model"],
@@ -29,31 +70,129 @@ class FilterLib:
             persist=persist,
             conf=conf,
             classes=classes,
+            engine=self._engine,
+            trackMaxAge=trackMaxAge if trackMaxAge > 0 else None,
+            trackMaxAgeSec=trackMaxAgeSec,
+            maxTracks=maxTracks,
+            stride=stride,
+            adaptive=adaptive,
+            maxStride=maxStride,
+            backend=backend,
+            imgsz=imgsz,
+            threads=threads,
         )
 
         return self._yoloModel
 
-    def yoloUpdate(self, frame: MatLike) -> MatLike:
+    def buildChain(self, filterConfig: dict) -> list[Callable]:
+        chain: list[Callable] = list()
+
+        if self._yoloModel is not None:
+            chain.append(self._yoloModel.update)
+
+        filterConfig = {
+            key: val
+            for key, val in sorted(filterConfig.items(), key=lambda ele: ele[1]["index"])
+        }
+
+        for key, params in filterConfig.items():
+            func = None
+
+            if key == "trailBalls":
+                func = self.trailBalls
+
+                if self._yoloModel is None:
+                    continue
+
+                maxBalls: int = getDictV(params, "maxBalls", default=30)
+                self._yoloModel.maxBallTrack = maxBalls
+
+                ballThickness: int = getDictV(params, "ballThickness", default=5)
+                self._yoloModel.ballThickness = ballThickness
+
+            elif key == "stopBoxes":
+                func = self.stopBoxes
+
+                if self._yoloModel is None:
+                    continue
+
+                stopTime: int = getDictV(params, "stopTime", default=5)
+                self._yoloModel.stopTimeThreshold = stopTime
+
+                triggerColor: list = getDictV(
+                    params, "triggerColor", default=[56, 26, 211]
+                )
+                self._yoloModel.triggerColor = triggerColor
+
+                neutralColor: list = getDictV(
+                    params, "neutralColor", default=[128, 128, 128]
+                )
+                self._yoloModel.neutralColor = neutralColor
+
+            elif key == "fps":
+                func = self.displayFPS
+
+            if func is None:
+                continue
+            chain.append(func)
+
+        return chain
+
+    @drawsInPlace
+    def yoloUpdate(self, frame: MatLike, timestamp: float | None = None) -> MatLike:
         if self._yoloModel is None:
             raise ValueError(f"Yolo model not set, receive {type(self._yoloModel)}")
-        return self._yoloModel.update(frame)
+        return self._yoloModel.update(frame, timestamp)
 
-    def trailBalls(self, frame: MatLike) -> MatLike:
+    @drawsInPlace
+    @drawsAnnotation
+    def trailBalls(self, frame: MatLike, timestamp: float | None = None) -> MatLike:
         if self._yoloModel is None:
             raise ValueError(f"Yolo model not set, receive {type(self._yoloModel)}")
-        return self._yoloModel.trailBalls(frame)
+        if "trailBalls" in self._disabled:
+            return frame
+        return self._yoloModel.trailBalls(frame, timestamp)
 
-    def stopBoxes(self, frame: MatLike) -> MatLike:
+    @drawsInPlace
+    @drawsAnnotation
+    def stopBoxes(self, frame: MatLike, timestamp: float | None = None) -> MatLike:
         if self._yoloModel is None:
             raise ValueError(f"Yolo model not set, receive {type(self._yoloModel)}")
-        return self._yoloModel.stopBoxes(frame)
-
-    def displayFPS(self, frame: MatLike) -> MatLike:
-        oldTime: float = self._lastUpdateTime
-        self._lastUpdateTime = time()
-        delay = (self._lastUpdateTime - oldTime)
-        fps = 1 / delay if delay > 0 else 0
-        text = f"FPS: {fps:.2f}"
+        if "stopBoxes" in self._disabled:
+            return frame
+        return self._yoloModel.stopBoxes(frame, timestamp)
+
+    @drawsInPlace
+    def recordDetections(self, frame: MatLike, timestamp: float | None = None) -> MatLike:
+        if self._detectionSink is None or self._yoloModel is None:
+            return frame
+
+        timestamp = timestamp if timestamp is not None else self._yoloModel.frameTime
+        self._detectionSink.write(
+            self._sinkName,
+            self._recordedFrames,
+            timestamp,
+            self._yoloModel.detectionRecords(),
+        )
+        self._recordedFrames += 1
+        return frame
+
+    def close(self) -> None:
+        if self._detectionSink is not None:
+            self._detectionSink.close()
+
+    @drawsInPlace
+    @drawsAnnotation
+    def displayFPS(self, frame: MatLike, timestamp: float | None = None) -> MatLike:
+        oldTime: float | None = self._lastUpdateTime
+        newTime = timestamp if timestamp is not None else time()
+        # a repeated frame keeps the last reading instead of showing 0,
+        # a clock that jumped back (reconnect) only restarts the measurement
+        if oldTime is None or newTime != oldTime:
+            self._lastUpdateTime = newTime
+            if oldTime is not None and newTime > oldTime:
+                self._fps = 1 / (newTime - oldTime)
+        text = f"FPS: {self._fps:.2f}"
         color = (0, 0, 255)
         position = (frame.shape[1] - 10 - len(text) * 20, frame.shape[0] - 10)
         putText(frame, text, position, FONT_HERSHEY_SIMPLEX, 1, color, 2)
@@ -0,0 +1,85 @@
+from cv2 import (
+    COLOR_BGR2GRAY,
+    INTER_AREA,
+    GaussianBlur,
+    THRESH_BINARY,
+    absdiff,
+    accumulateWeighted,
+    convertScaleAbs,
+    countNonZero,
+    cvtColor,
+    resize,
+    threshold,
+)
+from cv2.typing import MatLike
+from numpy import float32
+
+
+class MotionGate:
+    def __init__(
+        self,
+        pixelThreshold: int = 25,
+        minArea: float = 0.002,
+        width: int = 160,
+        learningRate: float = 0.05,
+        holdFrames: int = 5,
+    ) -> None:
+        if not 0 < pixelThreshold < 256:
+            raise ValueError("pixelThreshold must be between 1 and 255")
+        if not 0 <= minArea < 1:
+            raise ValueError("minArea must be a fraction between 0 and 1")
+        if width <= 0:
+            raise ValueError("width must be greater than 0")
+
+        self._pixelThreshold: int = pixelThreshold
+        self._minArea: float = minArea
+        self._width: int = width
+        self._learningRate: float = learningRate
+        self._holdFrames: int = holdFrames
+        self._background = None
+        self._hold: int = 0
+        self._checks: int = 0
+        self._skips: int = 0
+
+    @property
+    def checks(self) -> int:
+        return self._checks
+
+    @property
+    def skips(self) -> int:
+        return self._skips
+
+    @property
+    def hitRate(self) -> float:
+        return self._skips / self._checks if self._checks else 0.0
+
+    def _prepare(self, frame: MatLike) -> MatLike:
+        height = max(int(frame.shape[0] * self._width / frame.shape[1]), 1)
+        small = resize(frame, (self._width, height), interpolation=INTER_AREA)
+        gray = cvtColor(small, COLOR_BGR2GRAY)
+        return GaussianBlur(gray, (5, 5), 0)
+
+    def check(self, frame: MatLike) -> bool:
+        self._checks += 1
+        gray = self._prepare(frame)
+
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(float32)
+            self._hold = self._holdFrames
+            return True
+
+        diff = absdiff(gray, convertScaleAbs(self._background))
+        _, mask = threshold(diff, self._pixelThreshold, 255, THRESH_BINARY)
+        accumulateWeighted(gray, self._background, self._learningRate)
+
+        if countNonZero(mask) > self._minArea * mask.size:
+            self._hold = self._holdFrames
+            return True
+
+        # keep the model running a little after motion so tracks settle
+        if self._hold > 0:
+            self._hold -= 1
+            return True
+
+        self._skips += 1
+        return False
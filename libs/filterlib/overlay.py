@@ -0,0 +1,87 @@
+from cv2 import FONT_HERSHEY_SIMPLEX, boundingRect, getTextSize, polylines, putText, rectangle
+from cv2.typing import MatLike
+from numpy import copyto, ndarray, uint8, zeros
+
+
+class AnnotationLayer:
+    def __init__(self) -> None:
+        self._overlay: ndarray | None = None
+        self._mask: ndarray | None = None
+        # [x0, y0, x1, y1] around everything drawn since the last clear
+        self._bounds: list[int] | None = None
+        self._signature = None
+        self._lineWidth: int = 2
+
+    def begin(self, shape: tuple, signature=None) -> bool:
+        # True when the caller has to draw, False when the last drawing still holds
+        if self._overlay is None or self._overlay.shape != shape:
+            self._overlay = zeros(shape, dtype=uint8)
+            self._mask = zeros(shape[:2], dtype=uint8)
+            self._bounds = None
+            self._signature = None
+            # same line width the ultralytics Annotator picks for this frame size
+            self._lineWidth = max(round(sum(shape) / 2 * 0.003), 2)
+        elif signature is not None and signature == self._signature:
+            return False
+
+        self._signature = signature
+        self.clear()
+        return True
+
+    def clear(self) -> None:
+        # only the area drawn last time is dirty
+        if self._bounds is None:
+            return
+        x0, y0, x1, y1 = self._bounds
+        self._overlay[y0:y1, x0:x1] = 0
+        self._mask[y0:y1, x0:x1] = 0
+        self._bounds = None
+
+    def _extend(self, x0: int, y0: int, x1: int, y1: int) -> None:
+        h, w = self._mask.shape
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, w), min(y1, h)
+        if self._bounds is not None:
+            bx0, by0, bx1, by1 = self._bounds
+            x0, y0, x1, y1 = min(x0, bx0), min(y0, by0), max(x1, bx1), max(y1, by1)
+        self._bounds = [x0, y0, x1, y1]
+
+    def polyline(self, points: MatLike, color: tuple, thickness: int) -> None:
+        polylines(self._overlay, [points], isClosed=False, color=color, thickness=thickness)
+        polylines(self._mask, [points], isClosed=False, color=255, thickness=thickness)
+        x, y, w, h = boundingRect(points)
+        self._extend(x - thickness, y - thickness, x + w + thickness, y + h + thickness)
+
+    def boxLabel(
+        self, box, text: str, color: tuple, textColor: tuple = (255, 255, 255)
+    ) -> None:
+        lw = self._lineWidth
+        p1, p2 = (int(box[0]), int(box[1])), (int(box[2]), int(box[3]))
+        rectangle(self._overlay, p1, p2, color, lw)
+        rectangle(self._mask, p1, p2, 255, lw)
+
+        # label sits above the box, or inside it at the top edge of the frame
+        tf = max(lw - 1, 1)
+        scale = lw / 3
+        (w, h), _ = getTextSize(text, FONT_HERSHEY_SIMPLEX, scale, tf)
+        outside = p1[1] >= h + 3
+        t2 = (p1[0] + w, p1[1] - h - 3 if outside else p1[1] + h + 3)
+        rectangle(self._overlay, p1, t2, color, -1)
+        rectangle(self._mask, p1, t2, 255, -1)
+        origin = (p1[0], p1[1] - 2 if outside else p1[1] + h + 2)
+        putText(self._overlay, text, origin, FONT_HERSHEY_SIMPLEX, scale, textColor, tf)
+
+        self._extend(
+            min(p1[0], p2[0]) - lw,
+            min(p1[1], p2[1], t2[1]) - lw,
+            max(p2[0], t2[0]) + lw,
+            max(p2[1], t2[1]) + lw,
+        )
+
+    def compose(self, frame: MatLike) -> MatLike:
+        # one masked copy over the drawn area, the rest of the frame is untouched
+        if self._bounds is None:
+            return frame
+        x0, y0, x1, y1 = self._bounds
+        mask = self._mask[y0:y1, x0:x1, None] != 0
+        copyto(frame[y0:y1, x0:x1], self._overlay[y0:y1, x0:x1], where=mask)
+        return frame
@@ -0,0 +1,46 @@
+from cv2 import bitwise_and, fillPoly
+from cv2.typing import MatLike
+from numpy import array, int32, zeros, uint8
+
+
+class RegionOfInterest:
+    def __init__(
+        self, crop: list[int] | None = None, polygons: list[list] | None = None
+    ) -> None:
+        if crop is not None and (len(crop) != 4 or crop[2] <= 0 or crop[3] <= 0):
+            raise ValueError("crop must be [x, y, width, height] with a positive size")
+
+        self._crop: list[int] | None = crop
+        self._polygons: list = [
+            array(polygon, dtype=int32).reshape((-1, 1, 2)) for polygon in polygons or []
+        ]
+        self._mask: MatLike | None = None
+
+    @property
+    def offset(self) -> tuple[int, int]:
+        if self._crop is None:
+            return 0, 0
+        return self._crop[0], self._crop[1]
+
+    def crop(self, frame: MatLike) -> MatLike:
+        if self._crop is None:
+            return frame
+        x, y, w, h = self._crop
+        # a slice, not a copy
+        return frame[y : y + h, x : x + w]
+
+    def _buildMask(self, shape: tuple) -> MatLike:
+        # polygons are given in full-frame coordinates, shift them into the crop
+        ox, oy = self.offset
+        mask = zeros(shape[:2], dtype=uint8)
+        fillPoly(mask, [polygon - (ox, oy) for polygon in self._polygons], 255)
+        return mask
+
+    def apply(self, frame: MatLike) -> MatLike:
+        region = self.crop(frame)
+        if not self._polygons:
+            return region
+
+        if self._mask is None or self._mask.shape != region.shape[:2]:
+            self._mask = self._buildMask(region.shape)
+        return bitwise_and(region, region, mask=self._mask)
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class TrackStore:
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        maxAge: int = 30,
+        maxAgeSec: float = 0.0,
+        maxTracks: int = 1000,
+        onEvict: Callable[[int, Any], None] | None = None,
+    ) -> None:
+        self._factory: Callable[[], Any] = factory
+        self._onEvict: Callable[[int, Any], None] | None = onEvict
+        # id -> [value, last seen frame index, last seen timestamp], oldest first
+        self._tracks: OrderedDict = OrderedDict()
+        self._maxAge: int = 0
+        self._maxAgeSec: float = 0.0
+        self._maxTracks: int = 0
+        self._expired: int = 0
+        self._capped: int = 0
+
+        self.maxAge = maxAge
+        self.maxAgeSec = maxAgeSec
+        self.maxTracks = maxTracks
+
+    @property
+    def maxAge(self) -> int:
+        return self._maxAge
+
+    @property
+    def maxAgeSec(self) -> float:
+        return self._maxAgeSec
+
+    @property
+    def maxTracks(self) -> int:
+        return self._maxTracks
+
+    @property
+    def size(self) -> int:
+        return len(self._tracks)
+
+    @property
+    def expired(self) -> int:
+        return self._expired
+
+    @property
+    def capped(self) -> int:
+        return self._capped
+
+    @property
+    def evictions(self) -> int:
+        return self._expired + self._capped
+
+    @maxAge.setter
+    def maxAge(self, value: int) -> None:
+        if value <= 0:
+            raise ValueError("maxAge must be greater than 0")
+        self._maxAge = value
+
+    @maxAgeSec.setter
+    def maxAgeSec(self, value: float) -> None:
+        if value < 0:
+            raise ValueError("maxAgeSec must not be negative")
+        self._maxAgeSec = value
+
+    @maxTracks.setter
+    def maxTracks(self, value: int) -> None:
+        if value <= 0:
+            raise ValueError("maxTracks must be greater than 0")
+        self._maxTracks = value
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def __contains__(self, id: int) -> bool:
+        return id in self._tracks
+
+    def __iter__(self):
+        return iter(self._tracks)
+
+    def get(self, id: int, default: Any = None) -> Any:
+        entry = self._tracks.get(id)
+        return entry[0] if entry is not None else default
+
+    def touch(self, id: int, frameIndex: int, timestamp: float) -> Any:
+        entry = self._tracks.get(id)
+        if entry is None:
+            entry = [self._factory(), frameIndex, timestamp]
+            self._tracks[id] = entry
+        else:
+            entry[1] = frameIndex
+            entry[2] = timestamp
+            self._tracks.move_to_end(id)
+        return entry[0]
+
+    def step(self, frameIndex: int, timestamp: float) -> None:
+        # entries are ordered by last sighting, so stale ones sit at the front
+        while self._tracks:
+            _, (_, lastFrame, lastTime) = next(iter(self._tracks.items()))
+            staleFrames = frameIndex - lastFrame > self._maxAge
+            staleTime = self._maxAgeSec > 0 and timestamp - lastTime > self._maxAgeSec
+            if not (staleFrames or staleTime):
+                break
+            self._evict()
+            self._expired += 1
+
+        while len(self._tracks) > self._maxTracks:
+            self._evict()
+            self._capped += 1
+
+    def _evict(self) -> None:
+        id, (value, _, _) = self._tracks.popitem(last=False)
+        if self._onEvict is not None:
+            self._onEvict(id, value)
+
+    def clear(self) -> None:
+        while self._tracks:
+            self._evict()
@@ -0,0 +1,146 @@
+from cv2.typing import MatLike
+from numpy import (
+    arange,
+    bool_,
+    empty,
+    float64,
+    hypot,
+    int32,
+    intp,
+    isnan,
+    maximum,
+    minimum,
+    nan,
+    where,
+    ndarray,
+    rint,
+    zeros,
+)
+from numpy.random import default_rng
+
+
+class TrailBuffer:
+    def __init__(self, capacity: int = 1000, length: int = 30) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0")
+        if length <= 0:
+            raise ValueError("length must be greater than 0")
+
+        self._capacity: int = 0
+        self._length: int = length
+        self._free: list[int] = list()
+        self._rng = default_rng()
+        self._points = empty((0, 2 * length, 2), dtype=int32)
+        self._counts = empty(0, dtype=intp)
+        self._heads = empty(0, dtype=intp)
+        self._stopSince = empty(0, dtype=float64)
+        self._stopped = empty(0, dtype=bool_)
+        self._grow(capacity)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def length(self) -> int:
+        return self._length
+
+    @property
+    def active(self) -> int:
+        return self._capacity - len(self._free)
+
+    @property
+    def stopSince(self) -> ndarray:
+        return self._stopSince
+
+    @property
+    def stopped(self) -> ndarray:
+        return self._stopped
+
+    @length.setter
+    def length(self, value: int) -> None:
+        if value <= 0:
+            raise ValueError("length must be greater than 0")
+        if value == self._length:
+            return
+        # trail history is dropped, stop state survives
+        self._length = value
+        self._points = zeros((self._capacity, 2 * value, 2), dtype=int32)
+        self._counts[:] = 0
+        self._heads[:] = 0
+
+    def _grow(self, capacity: int) -> None:
+        old = self._capacity
+        points = zeros((capacity, 2 * self._length, 2), dtype=int32)
+        points[:old] = self._points
+        counts = zeros(capacity, dtype=intp)
+        counts[:old] = self._counts
+        heads = zeros(capacity, dtype=intp)
+        heads[:old] = self._heads
+        stopSince = empty(capacity, dtype=float64)
+        stopSince[:old] = self._stopSince
+        stopSince[old:] = nan
+        stopped = zeros(capacity, dtype=bool_)
+        stopped[:old] = self._stopped
+
+        self._points, self._counts, self._heads = points, counts, heads
+        self._stopSince, self._stopped = stopSince, stopped
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self._capacity = capacity
+
+    def acquire(self) -> int:
+        if not self._free:
+            self._grow(self._capacity * 2)
+        return self._free.pop()
+
+    def release(self, slot: int) -> None:
+        self._counts[slot] = 0
+        self._heads[slot] = 0
+        self._stopSince[slot] = nan
+        self._stopped[slot] = False
+        self._free.append(slot)
+
+    def append(self, slots: ndarray, centers: ndarray) -> None:
+        # every point is written twice (at i and i + length) so the newest
+        # `count` points are always one contiguous, ordered window
+        heads = self._heads[slots]
+        points = rint(centers).astype(int32)
+        self._points[slots, heads] = points
+        self._points[slots, heads + self._length] = points
+        self._heads[slots] = (heads + 1) % self._length
+        self._counts[slots] = minimum(self._counts[slots] + 1, self._length)
+
+    def _windowEnds(self, heads):
+        # a head of 0 means the last write landed on the final mirrored row
+        return where(heads == 0, 2 * self._length, heads + self._length)
+
+    def trail(self, slot: int) -> MatLike:
+        end = int(self._windowEnds(self._heads[slot]))
+        start = end - int(self._counts[slot])
+        return self._points[slot, start:end].reshape((-1, 1, 2))
+
+    def detectStops(
+        self, slots: ndarray, threshold: float, timestamp: float, sampleRate: float
+    ) -> None:
+        if len(slots) == 0:
+            return
+
+        counts = self._counts[slots]
+        starts = self._windowEnds(self._heads[slots]) - counts
+
+        # random subset of each trail, walked as consecutive pairs like the
+        # old per-track loop, but for every active track at once
+        sampleSizes = maximum(rint(counts * sampleRate).astype(intp), 2)
+        width = int(sampleSizes.max())
+        offsets = (self._rng.random((len(slots), width)) * counts[:, None]).astype(intp)
+        samples = self._points[slots[:, None], starts[:, None] + offsets].astype(float64)
+
+        steps = samples[:, 1:] - samples[:, :-1]
+        distances = hypot(steps[..., 0], steps[..., 1])
+        valid = arange(width - 1)[None, :] < (sampleSizes - 1)[:, None]
+        overlap = ((distances <= threshold) | ~valid).all(axis=1)
+
+        fresh = isnan(self._stopSince[slots])
+        self._stopped[slots] = overlap & ~fresh
+        moving = slots[fresh | ~overlap]
+        self._stopSince[moving] = timestamp
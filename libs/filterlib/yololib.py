@@ -1,17 +1,25 @@
-from typing import DefaultDict
-from itertools import pairwise
-from math import sqrt
-from random import sample
-from time import time
+from collections import deque
+from time import time, monotonic, perf_counter
+from typing import Callable
 
 from ultralytics import YOLO
 from ultralytics.engine.model import Model
-from ultralytics.utils.plotting import Annotator
+from ultralytics.utils.plotting import Annotator, colors
+from torch import as_tensor, tensor
 
 from cv2.typing import MatLike
-from cv2 import ellipse2Poly, polylines, resize
+from cv2 import ellipse2Poly, resize
 
-from numpy import hstack, int32
+from numpy import array, empty, int32, intp, rint, zeros_like
+
+from libs.utilslib import drawsInPlace
+from libs.metricslib.stats import StageStats
+from .engine import InferenceEngine, createTracker
+from .trackstore import TrackStore
+from .trails import TrailBuffer
+from .motion import MotionGate
+from .roi import RegionOfInterest
+from .overlay import AnnotationLayer
 
 
 class YoloDecLib:
@@ -24,10 +32,23 @@ class YoloDecLib:
         classes: list = [],
         maxBallTrack: int = 30,
         ballThickness: int = 5,
+        engine: InferenceEngine | None = None,
+        trackMaxAge: int | None = None,
+        trackMaxAgeSec: float = 0.0,
+        maxTracks: int = 1000,
+        stride: int = 1,
+        adaptive: bool = False,
+        maxStride: int = 8,
+        motionGate: MotionGate | None = None,
+        roi: RegionOfInterest | None = None,
+        backend: str = "pytorch",
+        imgsz: int = 640,
+        threads: int = 0,
     ) -> None:
-        self._centerPoints: dict = DefaultDict(lambda: [list(), 0, False])
-        self._currentBoxes: list = list()
+        self._currentBoxes = empty((0, 4))
         self._currentIDs: list = list()
+        self._currentCls: list = list()
+        self._currentConf: list = list()
         self._maxBallTrack: int = maxBallTrack
         self._ballThickness: int = ballThickness
         self._sampleRate: float = 0.2
@@ -36,13 +57,129 @@ class YoloDecLib:
         self._triggerColor: list = [56, 26, 211]
         self._neutralColor: list = [128, 128, 128]
 
-        self._modelPath: str = modelPath
         self._yoloTracker: str = yoloTracker
-        self._model: YOLO = YOLO(self._modelPath)
+        self._engine: InferenceEngine = engine if engine is not None else InferenceEngine()
+        self._backend: str = backend
+        self._modelPath: str = self._engine.resolveModel(modelPath, backend, imgsz, threads)
+        self._model: YOLO = self._engine.getModel(self._modelPath)
+        self._tracker = createTracker(self._yoloTracker) if persist else None
+        self._frameIndex: int = 0
+        self._frameTime: float = time()
+
+        # forget ids the tracker itself has given up on, see track_buffer
+        if trackMaxAge is None:
+            trackMaxAge = self._tracker.max_time_lost if self._tracker else 30
+        self._trails: TrailBuffer = TrailBuffer(capacity=maxTracks, length=maxBallTrack)
+        self._centerPoints: TrackStore = TrackStore(
+            self._trails.acquire,
+            maxAge=max(trackMaxAge, 1),
+            maxAgeSec=trackMaxAgeSec,
+            maxTracks=maxTracks,
+            onEvict=self._evictTrack,
+        )
+        # per-track drawing state, dropped with the track
+        self._trailColors: dict[int, tuple] = dict()
+        self._stopLabels: dict[int, tuple[int, str]] = dict()
+        self._trailLayer: AnnotationLayer = AnnotationLayer()
+        self._stopLayer: AnnotationLayer = AnnotationLayer()
+        self._pendingResults: list | None = None
+        self._lastResults: list = list()
         self._persist: bool = persist
         self._conf: float = conf
         self._classes: list = classes
 
+        if stride <= 0:
+            raise ValueError("stride must be greater than 0")
+        if maxStride < stride:
+            raise ValueError("maxStride must not be less than stride")
+        self._stride: int = stride
+        self._currentStride: int = stride
+        self._maxStride: int = maxStride
+        self._adaptive: bool = adaptive
+        self._scheduled: int = stride
+        self._externalSchedule: bool = False
+        # per scheduled frame, whether the motion gate held it; consumed by update
+        self._held: deque[bool] = deque(maxlen=256)
+        self._rateFrames: int = 0
+        self._rateStart: float = monotonic()
+        self._dropCounter: Callable[[], int] | None = None
+        self._lastDropped: int = 0
+        self._inferBoxes = empty((0, 4))
+        self._inferIDs: list = list()
+        self._velocities = empty((0, 4))
+        self._framesSinceInference: int = 0
+        self._inferences: int = 0
+        self._skipped: int = 0
+        self._motionGate: MotionGate | None = motionGate
+        self._roi: RegionOfInterest | None = roi
+        self._stats: StageStats = StageStats()
+
+    @property
+    def batchKey(self) -> tuple:
+        return (self._modelPath, self._conf, tuple(self._classes))
+
+    @property
+    def engine(self) -> InferenceEngine:
+        return self._engine
+
+    @property
+    def trackStore(self) -> TrackStore:
+        return self._centerPoints
+
+    @property
+    def trails(self) -> TrailBuffer:
+        return self._trails
+
+    @property
+    def lastResults(self) -> list:
+        return self._lastResults
+
+    @property
+    def stats(self) -> StageStats:
+        return self._stats
+
+    @property
+    def stride(self) -> int:
+        return self._currentStride
+
+    @property
+    def motionGate(self) -> MotionGate | None:
+        return self._motionGate
+
+    @motionGate.setter
+    def motionGate(self, value: MotionGate | None) -> None:
+        self._motionGate = value
+
+    @property
+    def dropCounter(self) -> Callable[[], int] | None:
+        return self._dropCounter
+
+    @dropCounter.setter
+    def dropCounter(self, value: Callable[[], int] | None) -> None:
+        # frames the screen overwrote before anyone read them, the adaptive stride's lag signal
+        self._dropCounter = value
+        self._lastDropped = value() if value is not None else 0
+
+    @property
+    def roi(self) -> RegionOfInterest | None:
+        return self._roi
+
+    @roi.setter
+    def roi(self, value: RegionOfInterest | None) -> None:
+        self._roi = value
+
+    @property
+    def inferences(self) -> int:
+        return self._inferences
+
+    @property
+    def skipped(self) -> int:
+        return self._skipped
+
+    @property
+    def frameTime(self) -> float:
+        return self._frameTime
+
     @property
     def triggerColor(self) -> list:
         return self._triggerColor
@@ -96,16 +233,7 @@ class YoloDecLib:
         if value <= 0:
             raise ValueError("maxBallTrack must be greater than 0")
         self._maxBallTrack = value
-
-    def _overlapSample(self, container: list, threshole: float) -> bool:
-        for x, y in pairwise(container):
-            if sqrt((x[0] - y[0]) ** 2 + (x[1] - y[1]) ** 2) > threshole:
-                return False
-        return True
-
-    def _randomSample(self, lst: list) -> list:
-        sampleSize = max(round(len(lst) * self._sampleRate), 2)
-        return sample(lst, sampleSize)
+        self._trails.length = value
 
     def _secToTimeString(self, timeSec: int) -> str:
         hours = timeSec // 3600  # Integer division to get the number of hours
@@ -117,92 +245,300 @@ class YoloDecLib:
 
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
-    def _appendTrackBalls(self, track: list, box: list) -> None:
-        cx = box[0] + (box[2] - box[0]) / 2
-        cy = box[1] + (box[3] - box[1]) / 2
-        track.append((cx, cy))
-        track.pop(0) if len(track) > self._maxBallTrack else None
+    def _evictTrack(self, id: int, slot: int) -> None:
+        self._trails.release(slot)
+        self._trailColors.pop(id, None)
+        self._stopLabels.pop(id, None)
+
+    def _trailColor(self, id: int) -> tuple:
+        color = self._trailColors.get(id)
+        if color is None:
+            color = self._trailColors[id] = (
+                (100 + hash(id * 2) % 150),
+                (100 + hash(id * 4) % 150),
+                (100 + hash(id * 6) % 150),
+            )
+        return color
+
+    def _stopLabel(self, id: int, duration: int) -> str:
+        # the text only changes once a second, format it then
+        cached = self._stopLabels.get(id)
+        if cached is not None and cached[0] == duration:
+            return cached[1]
+        text = f"[{id}] {self._secToTimeString(duration)}"
+        self._stopLabels[id] = (duration, text)
+        return text
+
+    def _readBoxes(self, results: list) -> tuple:
+        boxes = results[0].boxes
+        xyxy = boxes.xyxy.cpu().numpy()
+        cls = boxes.cls.int().cpu().tolist()
+        conf = boxes.conf.cpu().tolist()
+        ids = boxes.id.int().cpu().tolist() if boxes.id is not None else [None] * len(cls)
+        return xyxy, ids, cls, conf
+
+    def _updateTracks(self, boxes, ids: list) -> None:
+        self._frameIndex += 1
+        now = self._frameTime
+        self._currentBoxes = boxes
+        self._currentIDs = ids
+
+        # age by inferences like the tracker's max_time_lost, extrapolated frames
+        # between them must not evict an id the tracker still holds
+        age = self._inferences
+        if ids:
+            touch = self._centerPoints.touch
+            slots = array([touch(id, age, now) for id in ids], dtype=intp)
+
+            # update center points, then check every track for stops in one pass
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            self._trails.append(slots, centers)
+            self._trails.detectStops(slots, self._ballThickness, now, self._sampleRate)
+
+        self._centerPoints.step(age, now)
 
     def _persistAdditionalHandle(self, results: list):
-        try:
-            self._currentBoxes = results[0].boxes.xyxy.cpu()
-            self._currentIDs = results[0].boxes.id.int().cpu().tolist()
-
-            for box, id in zip(self._currentBoxes, self._currentIDs):
-                track = self._centerPoints[id][0]
-                timestamp = self._centerPoints[id][1]
+        boxes, ids, self._currentCls, self._currentConf = self._readBoxes(results)
+
+        # untracked detections carry no id, they don't feed trails or stops
+        if None in ids:
+            boxes, ids, self._currentCls, self._currentConf = empty((0, 4)), [], [], []
+
+        # per-frame box velocity between the last two inferences, for skipped frames
+        previous = dict(zip(self._inferIDs, self._inferBoxes))
+        elapsed = self._framesSinceInference + 1
+        self._velocities = zeros_like(boxes)
+        for i, id in enumerate(ids):
+            if id in previous:
+                self._velocities[i] = (boxes[i] - previous[id]) / elapsed
+
+        self._inferBoxes = boxes
+        self._inferIDs = ids
+        self._framesSinceInference = 0
+        self._updateTracks(boxes, ids)
+
+    def _extrapolate(self, frame: MatLike) -> MatLike:
+        self._skipped += 1
+        self._framesSinceInference += 1
+
+        if not self._persist:
+            # no tracker state to move, redraw the last detections on this frame
+            return self._drawDetections(frame)
+
+        boxes = self._inferBoxes + self._velocities * self._framesSinceInference
+        self._updateTracks(boxes, self._inferIDs)
+        return frame
 
-                # update center point
-                self._appendTrackBalls(track, box)
+    def _adaptStride(self) -> None:
+        self._rateFrames += 1
+        elapsed = monotonic() - self._rateStart
+        if elapsed < 1.0:
+            return
+
+        frames = self._rateFrames
+        self._rateFrames = 0
+        self._rateStart = monotonic()
+        if not self._adaptive or self._dropCounter is None:
+            return
+
+        dropped = self._dropCounter()
+        grown = max(dropped - self._lastDropped, 0)
+        self._lastDropped = dropped
+
+        # frames lost before processing: infer less often; none lost: infer more often
+        if grown > frames * 0.1:
+            self._currentStride = min(self._currentStride + 1, self._maxStride)
+        elif grown == 0:
+            self._currentStride = max(self._currentStride - 1, self._stride)
+
+    def _nextInference(self, frame: MatLike) -> bool:
+        self._adaptStride()
+        self._scheduled += 1
+        held = False
+        if self._scheduled >= self._currentStride:
+            self._scheduled = 0
+            region = self._roi.crop(frame) if self._roi is not None else frame
+            # static scene, only tag the frame so update() applies the hold
+            # on the thread that owns the boxes
+            held = self._motionGate is not None and not self._motionGate.check(region)
+            infer = not held
+        else:
+            infer = False
+        self._held.append(held)
+        return infer
 
-                # set up tracking points for detect stop vehicles
-                if timestamp != 0:
-                    sample = self._randomSample(track)
-                    overlap = self._overlapSample(sample, self._ballThickness)
-                    self._centerPoints[id][2] = overlap
+    def _hold(self) -> None:
+        # static scene, hold the last boxes where they are
+        if self._persist:
+            self._inferBoxes = self._currentBoxes
+            self._inferIDs = self._currentIDs
+            self._framesSinceInference = 0
+        self._velocities = zeros_like(self._inferBoxes)
+
+    def scheduleInference(self, frame: MatLike) -> bool:
+        # the caller batches inference itself and only submits when this is true
+        self._externalSchedule = True
+        return self._nextInference(frame)
+
+    def _trackResults(self, results: list, frame: MatLike) -> list:
+        # the model is shared between screens, so each screen keeps its own tracker
+        det = results[0].boxes.cpu().numpy()
+        if len(det) == 0:
+            return results
+
+        tracks = self._tracker.update(det, frame)
+        if len(tracks) == 0:
+            return results
+
+        idx = tracks[:, -1].astype(int)
+        results[0] = results[0][idx]
+        results[0].update(boxes=as_tensor(tracks[:, :-1]))
+        return results
+
+    def detectionRecords(self) -> list[dict]:
+        records: list[dict] = list()
+        for id, box, cls, conf in zip(
+            self._currentIDs,
+            self._currentBoxes.tolist(),
+            self._currentCls,
+            self._currentConf,
+        ):
+            slot = self._centerPoints.get(id) if id is not None else None
+            stopStart = None
+            stopDuration = 0.0
+            if slot is not None and self._trails.stopped[slot]:
+                stopStart = float(self._trails.stopSince[slot])
+                stopDuration = round(self._frameTime - stopStart, 3)
+
+            records.append(
+                {
+                    "id": id,
+                    "box": [round(v, 1) for v in box],
+                    "cls": cls,
+                    "conf": round(conf, 3),
+                    "stopStart": stopStart,
+                    "stopDuration": stopDuration,
+                }
+            )
+        return records
 
-                    if not overlap:
-                        self._centerPoints[id][1] = time()
-                else:
-                    self._centerPoints[id][1] = time()
+    def _drawDetections(self, frame: MatLike) -> MatLike:
+        # Results.plot() deep-copies the image, the annotator draws on the frame itself
+        annotator = Annotator(frame)
+        names: dict = self._lastResults[0].names if self._lastResults else dict()
+        for box, cls, conf in zip(self._currentBoxes, self._currentCls, self._currentConf):
+            annotator.box_label(
+                box, f"{names.get(cls, cls)} {conf:.2f}", color=colors(cls, True)
+            )
+        return annotator.result()
 
-        except AttributeError:
-            self._currentBoxes = list()
-            self._currentIDs = list()
+    def _mapResults(self, results: list, frame: MatLike) -> list:
+        if self._roi is None:
+            return results
+
+        # boxes come back in crop coordinates, move them onto the full frame
+        ox, oy = self._roi.offset
+        for result in results:
+            data = result.boxes.data.clone()
+            data[:, :4] += tensor([ox, oy, ox, oy], dtype=data.dtype, device=data.device)
+            result.orig_img = frame
+            result.orig_shape = frame.shape[:2]
+            result.update(boxes=data)
+        return results
+
+    def prepareInput(self, frame: MatLike) -> MatLike:
+        return self._roi.apply(frame) if self._roi is not None else frame
+
+    def setResults(self, results: list) -> None:
+        self._pendingResults = results
+
+    def predict(self, frame: MatLike) -> list:
+        return self._engine.predict(
+            self._modelPath, [self.prepareInput(frame)], self._conf, self._classes
+        )
+
+    @drawsInPlace
+    def update(self, frame: MatLike, timestamp: float | None = None) -> MatLike:
+        self._frameTime = timestamp if timestamp is not None else time()
+
+        infer = not self._externalSchedule and self._nextInference(frame)
+        # frames reach update in the order they were scheduled
+        if self._held and self._held.popleft():
+            self._hold()
+
+        if self._pendingResults is not None:
+            results = self._pendingResults
+        elif infer:
+            beginTime = perf_counter()
+            results = self.predict(frame)
+            self._stats.record("inference", perf_counter() - beginTime)
+        else:
+            beginTime = perf_counter()
+            frame = self._extrapolate(frame)
+            self._stats.record("extrapolate", perf_counter() - beginTime)
+            return frame
+        self._pendingResults = None
+        self._inferences += 1
+        results = self._mapResults(results, frame)
 
-    def update(self, frame: MatLike) -> MatLike:
         if self._persist:
-            results: list = self._model.track(
-                source=frame,
-                persist=self._persist,
-                tracker=self._yoloTracker,
-                verbose=False,
-                conf=self._conf,
-                classes=self._classes,
-            )
-
+            beginTime = perf_counter()
+            results = self._trackResults(results, frame)
             self._persistAdditionalHandle(results)
+            self._stats.record("track", perf_counter() - beginTime)
         else:
-            results: list = self._model.predict(
-                source=frame,
-                verbose=False,
-                conf=self._conf,
-                classes=self._classes,
-            )
-            frame = results[0].plot()
+            boxes, ids, self._currentCls, self._currentConf = self._readBoxes(results)
+            self._currentBoxes, self._currentIDs = boxes, ids
 
-        return frame
+        self._lastResults = results
+        if not self._persist:
+            frame = self._drawDetections(frame)
 
-    def trailBalls(self, frame: MatLike) -> MatLike:
-        for id in self._currentIDs:
-            # Draw the tracking lines
-            points = hstack(self._centerPoints[id][0]).astype(int32).reshape((-1, 1, 2))
-            polylines(
-                frame,
-                [points],
-                isClosed=False,
-                color=(
-                    (100 + hash(id * 2) % 150),
-                    (100 + hash(id * 4) % 150),
-                    (100 + hash(id * 6) % 150),
-                ),
-                thickness=self._ballThickness,
-            )
         return frame
 
-    def stopBoxes(self, frame: MatLike) -> MatLike:
-        annotator = Annotator(frame)
-
+    @drawsInPlace
+    def trailBalls(self, frame: MatLike, timestamp: float | None = None) -> MatLike:
+        layer = self._trailLayer
+        # trails only move when the tracks do
+        signature = (self._frameIndex, self._ballThickness, self._maxBallTrack)
+        if layer.begin(frame.shape, signature):
+            for id in self._currentIDs:
+                slot = self._centerPoints.get(id)
+                if slot is None:
+                    continue
+
+                # Draw the tracking lines straight from the trail buffer
+                points = self._trails.trail(slot)
+                if len(points) == 0:
+                    continue
+                layer.polyline(points, self._trailColor(id), self._ballThickness)
+
+        return layer.compose(frame)
+
+    @drawsInPlace
+    def stopBoxes(self, frame: MatLike, timestamp: float | None = None) -> MatLike:
+        currentTime = timestamp if timestamp is not None else self._frameTime
+        stops: list = list()
         for box, id in zip(self._currentBoxes, self._currentIDs):
-            if self._centerPoints[id][2]:
-                beginStopTime = self._centerPoints[id][1]
-                currentTime = time()
-                duration = int(currentTime - beginStopTime)
-                ti = self._secToTimeString(duration)
-
+            slot = self._centerPoints.get(id)
+            if slot is not None and self._trails.stopped[slot]:
+                stops.append((id, box, int(currentTime - self._trails.stopSince[slot])))
+
+        # still objects keep the same boxes and labels, redraw only on a change
+        layer = self._stopLayer
+        signature = (
+            tuple((id, duration) for id, _, duration in stops),
+            rint([box for _, box, _ in stops]).astype(int32).tobytes(),
+            self._stopTimeThreshold,
+            tuple(self._triggerColor),
+            tuple(self._neutralColor),
+        )
+        if layer.begin(frame.shape, signature):
+            for id, box, duration in stops:
                 if duration < self._stopTimeThreshold:
-                    annotator.box_label(box, f"[{id}] {ti}")
+                    color = tuple(self._neutralColor)
                 else:
-                    annotator.box_label(box, f"[{id}] {ti}", color=(56, 26, 211))
+                    color = tuple(self._triggerColor)
+                layer.boxLabel(box, self._stopLabel(id, duration), color)
 
-        return annotator.result()
+        return layer.compose(frame)
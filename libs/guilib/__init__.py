@@ -0,0 +1,2 @@
+from .delivery import FrameDelivery, FrameSink
+from .window import ViewerWindow, runGUI
@@ -0,0 +1,68 @@
+from time import perf_counter
+
+from cv2.typing import MatLike
+from PySide6.QtCore import QThread, Signal
+from PySide6.QtGui import QImage
+
+from libs.screenlib.screen import Screen, toQImage
+
+
+class FrameSink:
+    # pipeline sink keeping only the newest filtered frame of each screen,
+    # holding the reference keeps the pool from reusing that buffer
+    def __init__(self) -> None:
+        self._frames: dict[str, tuple[MatLike, float, int]] = dict()
+
+    def __call__(self, screen: Screen, frame: MatLike, timestamp: float) -> None:
+        previous = self._frames.get(screen.name)
+        seq = previous[2] + 1 if previous is not None else 1
+        self._frames[screen.name] = (frame, timestamp, seq)
+
+    def latest(self, name: str) -> tuple[MatLike | None, float, int]:
+        return self._frames.get(name, (None, 0.0, 0))
+
+
+class FrameDelivery(QThread):
+    frameReady: Signal = Signal(str, QImage)
+
+    def __init__(self, sink: FrameSink, names: list[str], fps: float, parent=None):
+        QThread.__init__(self, parent)
+        if fps <= 0:
+            raise ValueError("fps must be greater than 0")
+
+        self._sink: FrameSink = sink
+        self._names: list[str] = names
+        self._interval: float = 1 / fps
+        self._status: bool = True
+        self._sizes: dict[str, tuple[int, int]] = dict()
+        self._lastSeqs: dict[str, int] = dict()
+        # tiles the GUI thread hasn't painted yet are skipped, so a busy
+        # GUI never builds up a backlog of images
+        self._pending: set[str] = set()
+
+    def setTargetSize(self, name: str, size: tuple[int, int]) -> None:
+        self._sizes[name] = size
+
+    def ack(self, name: str) -> None:
+        self._pending.discard(name)
+
+    def run(self):
+        while self._status:
+            beginTime = perf_counter()
+            for name in self._names:
+                if name in self._pending or name not in self._sizes:
+                    continue
+                frame, _, seq = self._sink.latest(name)
+                if frame is None or seq == self._lastSeqs.get(name):
+                    continue
+
+                self._lastSeqs[name] = seq
+                self._pending.add(name)
+                self.frameReady.emit(name, toQImage(frame, self._sizes[name]))
+
+            remaining = self._interval - (perf_counter() - beginTime)
+            if remaining > 0:
+                self.msleep(int(remaining * 1000))
+
+    def close(self):
+        self._status = False
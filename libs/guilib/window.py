@@ -0,0 +1,252 @@
+import sys
+from math import ceil, sqrt
+
+from PySide6.QtCore import Qt, Signal, Slot
+from PySide6.QtGui import QAction, QImage, QKeySequence, QPixmap
+from PySide6.QtWidgets import (
+    QApplication,
+    QCheckBox,
+    QComboBox,
+    QFormLayout,
+    QGridLayout,
+    QGroupBox,
+    QHBoxLayout,
+    QLabel,
+    QMainWindow,
+    QSizePolicy,
+    QSpinBox,
+    QVBoxLayout,
+    QWidget,
+)
+
+from libs.applib import App
+from libs.filterlib.filter import FilterLib
+from libs.screenlib.screen import Screen
+from .delivery import FrameDelivery, FrameSink
+
+ALL_SCREENS: str = "All screens"
+
+
+class TileLabel(QLabel):
+    resized: Signal = Signal(str, int, int)
+
+    def __init__(self, name: str, parent=None):
+        super().__init__(parent)
+        self._name: str = name
+        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.setMinimumSize(160, 90)
+        # the pixmap must not drive the layout, the layout drives the pixmap size
+        self.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.resized.emit(self._name, self.width(), self.height())
+
+
+class ViewerWindow(QMainWindow):
+    def __init__(self, app: App, sink: FrameSink, fps: float):
+        super().__init__()
+        self._app: App = app
+        self._screens: dict[str, Screen] = {screen.name: screen for screen in app.screens}
+        self._tiles: dict[str, TileLabel] = dict()
+
+        ## +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        ## ===========================Threads=============================
+
+        self.th = FrameDelivery(sink, list(self._screens), fps, self)
+        self.th.frameReady.connect(self.setImage)
+
+        ## ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+        ## =============================Window=============================
+
+        self.setWindowTitle("CCTVTracker")
+        self.setGeometry(0, 0, 1280, 720)
+
+        centralWidget = QWidget()
+        self.setCentralWidget(centralWidget)
+        self.windowLayout = QHBoxLayout(centralWidget)
+
+        self.windowLayout.addWidget(self.createGrid(), stretch=1)
+        self.windowLayout.addWidget(self.createControllGroupbox())
+
+        self.initMenuBar()
+
+        self.th.start()
+
+    def createGrid(self) -> QWidget:
+        gridWidget = QWidget()
+        layout = QGridLayout(gridWidget)
+        columns = max(ceil(sqrt(len(self._screens))), 1)
+
+        for index, name in enumerate(self._screens):
+            group_box = QGroupBox(name)
+            group_layout = QVBoxLayout(group_box)
+            tile = TileLabel(name)
+            tile.resized.connect(self.setTileSize)
+            group_layout.addWidget(tile)
+            self._tiles[name] = tile
+            layout.addWidget(group_box, index // columns, index % columns)
+
+        return gridWidget
+
+    def createControllGroupbox(self) -> QWidget:
+        controllGroup = QGroupBox("Settings")
+        controllGroup.setMinimumWidth(220)
+        mainLayout = QVBoxLayout()
+        controllGroup.setLayout(mainLayout)
+
+        self.screenSelect = QComboBox()
+        self.screenSelect.addItems([ALL_SCREENS, *self._screens])
+
+        yoloModel = next(
+            (
+                filterLib.yoloModel
+                for filterLib in self._app.filterLibs.values()
+                if filterLib.yoloModel is not None
+            ),
+            None,
+        )
+
+        objTrailingGroupbox = QGroupBox("Object Trailing")
+        objTrailingLayout = QFormLayout()
+        objTrailingGroupbox.setLayout(objTrailingLayout)
+
+        self.toggleTrailingButton = QCheckBox("On/Off")
+        self.toggleTrailingButton.setChecked(self._configured("trailBalls"))
+        self.lengthInput = QSpinBox()
+        self.lengthInput.setRange(1, 100)
+        self.sizeInput = QSpinBox()
+        self.sizeInput.setRange(1, 100)
+
+        objTrailingLayout.addRow(self.toggleTrailingButton)
+        objTrailingLayout.addRow("Length:", self.lengthInput)
+        objTrailingLayout.addRow("Size:", self.sizeInput)
+
+        stopDetectionGroupbox = QGroupBox("Stop Detection")
+        stopDetectionLayout = QFormLayout()
+        stopDetectionGroupbox.setLayout(stopDetectionLayout)
+
+        self.toggleTimeStopButton = QCheckBox("On/Off")
+        self.toggleTimeStopButton.setChecked(self._configured("stopBoxes"))
+        self.stopTimeThresholdInput = QSpinBox()
+        self.stopTimeThresholdInput.setRange(1, 24 * 3600)
+
+        stopDetectionLayout.addRow(self.toggleTimeStopButton)
+        stopDetectionLayout.addRow("Stop Threshold:", self.stopTimeThresholdInput)
+
+        if yoloModel is not None:
+            self.lengthInput.setValue(yoloModel.maxBallTrack)
+            self.sizeInput.setValue(yoloModel.ballThickness)
+            self.stopTimeThresholdInput.setValue(yoloModel.stopTimeThreshold)
+        else:
+            objTrailingGroupbox.setEnabled(False)
+            stopDetectionGroupbox.setEnabled(False)
+
+        # connect after the initial values so they aren't pushed back to the screens
+        self.toggleTrailingButton.toggled.connect(self.setTrailing)
+        self.lengthInput.valueChanged.connect(self.setTrailLength)
+        self.sizeInput.valueChanged.connect(self.setTrailSize)
+        self.toggleTimeStopButton.toggled.connect(self.setStopDetection)
+        self.stopTimeThresholdInput.valueChanged.connect(self.setStopThreshold)
+
+        mainLayout.addWidget(self.screenSelect)
+        mainLayout.addWidget(objTrailingGroupbox)
+        mainLayout.addWidget(stopDetectionGroupbox)
+        mainLayout.addStretch()
+
+        return controllGroup
+
+    def initMenuBar(self):
+        self.menu = self.menuBar()
+
+        menuScreen = self.menu.addMenu("Screen")
+        exitAction = QAction("Exit", self)
+        exitAction.setShortcut("Ctrl+q")
+        exitAction.triggered.connect(self.close)
+        menuScreen.addAction(exitAction)
+
+        menuAbout = self.menu.addMenu("&About")
+        about = QAction("About Qt", self)
+        about.setShortcut(QKeySequence.StandardKey.HelpContents)
+        about.triggered.connect(QApplication.aboutQt)
+        menuAbout.addAction(about)
+
+    def _configured(self, name: str) -> bool:
+        return any(
+            getattr(filterLib, name) in screen.filters and filterLib.filterEnabled(name)
+            for screen, filterLib in self._targets(every=True)
+        )
+
+    def _targets(self, every: bool = False) -> list[tuple[Screen, FilterLib]]:
+        selected = self.screenSelect.currentText() if not every else ALL_SCREENS
+        return [
+            (screen, self._app.filterLibs[name])
+            for name, screen in self._screens.items()
+            if selected in (ALL_SCREENS, name)
+            and self._app.filterLibs[name].yoloModel is not None
+        ]
+
+    def _setFilter(self, name: str, enabled: bool) -> None:
+        for screen, filterLib in self._targets():
+            func = getattr(filterLib, name)
+            # screens configured without the filter get it appended on first use
+            if enabled and func not in screen.filters:
+                screen.callSoon(screen.addFilter, func)
+            screen.callSoon(filterLib.setFilterEnabled, name, enabled)
+
+    def _setModel(self, attribute: str, value: int) -> None:
+        for screen, filterLib in self._targets():
+            screen.callSoon(setattr, filterLib.yoloModel, attribute, value)
+
+    @Slot(bool)
+    def setTrailing(self, enabled: bool):
+        self._setFilter("trailBalls", enabled)
+
+    @Slot(int)
+    def setTrailLength(self, value: int):
+        self._setModel("maxBallTrack", value)
+
+    @Slot(int)
+    def setTrailSize(self, value: int):
+        self._setModel("ballThickness", value)
+
+    @Slot(bool)
+    def setStopDetection(self, enabled: bool):
+        self._setFilter("stopBoxes", enabled)
+
+    @Slot(int)
+    def setStopThreshold(self, value: int):
+        self._setModel("stopTimeThreshold", value)
+
+    @Slot(str, int, int)
+    def setTileSize(self, name: str, width: int, height: int):
+        self.th.setTargetSize(name, (width, height))
+
+    @Slot(str, QImage)
+    def setImage(self, name: str, image: QImage):
+        # already converted at tile size on the delivery thread
+        self._tiles[name].setPixmap(QPixmap.fromImage(image))
+        self.th.ack(name)
+
+    def closeEvent(self, event):
+        self.th.close()
+        self.th.wait()
+        self._app.stop()
+        self._app.join(2.0)
+        super().closeEvent(event)
+
+
+def runGUI(app: App, fps: float = 0.0) -> int:
+    qtApp = QApplication.instance() or QApplication(sys.argv)
+
+    # never deliver faster than the monitor can show
+    refreshRate = qtApp.primaryScreen().refreshRate() or 60.0
+    fps = min(fps, refreshRate) if fps > 0 else refreshRate
+
+    sink = FrameSink()
+    app.addSink(sink)
+    app.run(display=False)
+
+    window = ViewerWindow(app, sink, fps)
+    window.show()
+    return qtApp.exec()
@@ -0,0 +1,3 @@
+from .stats import StageStats
+from .registry import MetricsRegistry, stageSamples
+from .server import MetricsServer, MetricsReporter
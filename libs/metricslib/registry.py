@@ -0,0 +1,97 @@
+from typing import Callable, Iterable
+
+from .stats import StageStats
+
+# name -> (type, help)
+FAMILIES: dict[str, tuple[str, str]] = {
+    "cms_stage_seconds": ("summary", "Time spent per call in a pipeline stage"),
+    "cms_dropped_frames_total": ("counter", "Frames dropped before they were used"),
+    "cms_queue_depth": ("gauge", "Items waiting in a queue"),
+    "cms_inference_seconds_per_frame": ("gauge", "Mean model latency per frame"),
+    "cms_inferences_total": ("counter", "Frames sent to the model"),
+    "cms_skipped_frames_total": ("counter", "Frames served from extrapolated boxes"),
+    "cms_tracks": ("gauge", "Tracks currently held per screen"),
+    "cms_track_evictions_total": ("counter", "Tracks dropped by age or by the track cap"),
+    "cms_stride": ("gauge", "Current inference stride per screen"),
+    "cms_screen_health": ("gauge", "1 for the screen's current capture state"),
+    "cms_reconnects_total": ("counter", "Successful capture reconnects"),
+    "cms_motion_gate_checks_total": ("counter", "Frames checked by the motion gate"),
+    "cms_motion_gate_skips_total": ("counter", "Inferences skipped on a still scene"),
+    "cms_motion_gate_hit_rate": ("gauge", "Fraction of motion gate checks that skipped"),
+}
+QUANTILES: tuple = ("0.5", "0.9", "0.99")
+
+# (family, name suffix, labels, value)
+Sample = tuple[str, str, dict, float]
+
+
+def stageSamples(stats: StageStats, labels: dict) -> list[Sample]:
+    samples: list[Sample] = list()
+    for stage, values in stats.snapshot().items():
+        stageLabels = {**labels, "stage": stage}
+        for quantile, key in zip(QUANTILES, ("p50", "p90", "p99")):
+            samples.append(
+                ("cms_stage_seconds", "", {**stageLabels, "quantile": quantile}, values[key])
+            )
+        samples.append(("cms_stage_seconds", "_sum", stageLabels, values["sum"]))
+        samples.append(("cms_stage_seconds", "_count", stageLabels, values["calls"]))
+    return samples
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatLabels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._collectors: list[Callable[[], Iterable[Sample]]] = list()
+
+    def addCollector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        self._collectors.append(collector)
+
+    def collect(self) -> list[Sample]:
+        samples: list[Sample] = list()
+        for collector in self._collectors:
+            samples.extend(collector())
+        return samples
+
+    def render(self) -> str:
+        # prometheus text format, one HELP/TYPE header per family
+        families: dict[str, list[str]] = dict()
+        for family, suffix, labels, value in self.collect():
+            families.setdefault(family, list()).append(
+                f"{family}{suffix}{_formatLabels(labels)} {value}"
+            )
+
+        lines: list[str] = list()
+        for family, samples in families.items():
+            kind, help = FAMILIES.get(family, ("untyped", family))
+            lines.append(f"# HELP {family} {help}")
+            lines.append(f"# TYPE {family} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> list[str]:
+        # one compact line per screen for the periodic log
+        stages: dict[str, list[str]] = dict()
+        extras: dict[str, list[str]] = dict()
+        for family, suffix, labels, value in self.collect():
+            screen = labels.get("screen", "-")
+            if family == "cms_stage_seconds" and labels.get("quantile") == "0.5":
+                stages.setdefault(screen, list()).append(
+                    f"{labels['stage']} {value * 1000:.1f}ms"
+                )
+            elif family in ("cms_dropped_frames_total", "cms_queue_depth") and value:
+                name = labels.get("source", labels.get("queue", family))
+                extras.setdefault(screen, list()).append(f"{name} {value:g}")
+
+        return [
+            f"{screen}: " + ", ".join(stages.get(screen, list()) + extras.get(screen, list()))
+            for screen in dict.fromkeys([*stages, *extras])
+        ]
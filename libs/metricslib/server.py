@@ -0,0 +1,86 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from threading import Event, Thread
+
+from .registry import MetricsRegistry
+
+logger = getLogger(__name__)
+
+CONTENT_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    def __init__(
+        self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9100
+    ) -> None:
+        self._registry: MetricsRegistry = registry
+        self._server: ThreadingHTTPServer = ThreadingHTTPServer(
+            (host, port), self._handler()
+        )
+        self._server.daemon_threads = True
+        self._thread: Thread | None = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def _handler(self) -> type:
+        registry = self._registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                # scrapes every few seconds would flood the log
+                pass
+
+        return Handler
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = Thread(
+            target=self._server.serve_forever, name="metrics-http", daemon=True
+        )
+        self._thread.start()
+        logger.info("metrics on http://%s:%d/metrics", *self.address)
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+
+class MetricsReporter:
+    def __init__(self, registry: MetricsRegistry, interval: float = 30.0) -> None:
+        if interval <= 0:
+            raise ValueError("interval must be greater than 0")
+
+        self._registry: MetricsRegistry = registry
+        self._interval: float = interval
+        self._stopEvent: Event = Event()
+        self._thread: Thread = Thread(target=self._loop, name="metrics-log", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stopEvent.wait(self._interval):
+            for line in self._registry.summary():
+                logger.info("metrics %s", line)
+
+    def close(self) -> None:
+        self._stopEvent.set()
+        if self._thread.is_alive():
+            self._thread.join()
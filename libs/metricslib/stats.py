@@ -0,0 +1,47 @@
+from collections import defaultdict
+from threading import Lock
+
+from numpy import float64, percentile, zeros
+
+
+class StageStats:
+    def __init__(self, window: int = 512) -> None:
+        if window <= 0:
+            raise ValueError("window must be greater than 0")
+
+        self._window: int = window
+        self._lock: Lock = Lock()
+        # stage -> ring of the latest durations, percentiles come from these
+        self._samples: dict = dict()
+        self._calls: dict[str, int] = defaultdict(int)
+        self._totals: dict[str, float] = defaultdict(float)
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = zeros(self._window, dtype=float64)
+            samples[self._calls[stage] % self._window] = seconds
+            self._calls[stage] += 1
+            self._totals[stage] += seconds
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            stages = {
+                stage: (samples[: min(self._calls[stage], self._window)].copy(),)
+                + (self._calls[stage], self._totals[stage])
+                for stage, samples in self._samples.items()
+            }
+
+        snapshot: dict[str, dict] = dict()
+        for stage, (samples, calls, total) in stages.items():
+            p50, p90, p99 = percentile(samples, [50, 90, 99])
+            snapshot[stage] = {
+                "calls": calls,
+                "sum": total,
+                "p50": float(p50),
+                "p90": float(p90),
+                "p99": float(p99),
+                "max": float(samples.max()),
+            }
+        return snapshot
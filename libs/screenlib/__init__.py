@@ -1 +1,3 @@
 from .screen import Screen
+from .shmring import SharedFrameRing
+from .sources import SourceResolver
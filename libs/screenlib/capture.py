@@ -0,0 +1,110 @@
+import cv2
+from cv2 import (
+    CAP_ANY,
+    CAP_FFMPEG,
+    CAP_GSTREAMER,
+    CAP_PROP_BUFFERSIZE,
+    CAP_PROP_FPS,
+    CAP_PROP_FRAME_HEIGHT,
+    CAP_PROP_FRAME_WIDTH,
+    VideoCapture,
+)
+from logging import getLogger
+from os import environ
+from threading import Lock
+
+logger = getLogger(__name__)
+
+BACKENDS: dict[str, int] = {
+    "any": CAP_ANY,
+    "ffmpeg": CAP_FFMPEG,
+    "gstreamer": CAP_GSTREAMER,
+}
+
+FFMPEG_OPTIONS_ENV: str = "OPENCV_FFMPEG_CAPTURE_OPTIONS"
+
+# the FFmpeg backend reads its options from the environment at open time
+_envLock: Lock = Lock()
+
+
+def gstreamerPipeline(source: str, width: int = 0, height: int = 0, drop: int = 1) -> str:
+    if "://" not in source:
+        source = f"file://{source}"
+
+    # scale inside the pipeline so only small BGR frames reach python
+    caps = "video/x-raw,format=BGR"
+    if width > 0 and height > 0:
+        caps += f",width={width},height={height}"
+    return (
+        f'uridecodebin uri="{source}" ! videoconvert ! videoscale ! {caps} '
+        f"! appsink drop=true max-buffers={max(drop, 1)} sync=false"
+    )
+
+
+def ffmpegOptions(options: dict, keyframesOnly: bool = False) -> str:
+    options = dict(options)
+    if keyframesOnly:
+        # OpenCV's own key, mapped onto the codec context's skip_frame, options
+        # here only reach avformat_open_input so "skip_frame" would be ignored
+        options.setdefault("avdiscard", "nonkey")
+    return "|".join(f"{key};{value}" for key, value in options.items())
+
+
+def openCapture(source: str, options: dict | None = None, name: str = "") -> VideoCapture:
+    options = options or dict()
+    backend: str = options.get("backend", "any")
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {list(BACKENDS)}, got '{backend}'")
+
+    threads: int = int(options.get("threads", 0))
+    bufferSize: int = int(options.get("bufferSize", 0))
+    width: int = int(options.get("width", 0))
+    height: int = int(options.get("height", 0))
+    keyframesOnly: bool = bool(options.get("keyframesOnly", False))
+    openTimeout: float = float(options.get("openTimeout", 0.0))
+    readTimeout: float = float(options.get("readTimeout", 0.0))
+
+    params: list[int] = list()
+    nThreads = getattr(cv2, "CAP_PROP_N_THREADS", None)
+    if threads > 0 and nThreads is not None:
+        params += [nThreads, threads]
+    # bounded open/read so a dead camera can't hang its capture thread (OpenCV 4.6+)
+    for prop, seconds in (
+        (getattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC", None), openTimeout),
+        (getattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC", None), readTimeout),
+    ):
+        if seconds > 0 and prop is not None:
+            params += [prop, int(seconds * 1000)]
+
+    # a source containing "!" is already a full gstreamer pipeline
+    if backend == "gstreamer" and "!" not in source:
+        source = gstreamerPipeline(source, width, height, bufferSize)
+    # FFmpeg refuses unknown open params and fails the whole open, so for the
+    # other backends the frame size is left to Screen, which resizes after decode
+
+    with _envLock:
+        previous = environ.get(FFMPEG_OPTIONS_ENV)
+        ffmpeg = ffmpegOptions(options.get("ffmpeg", dict()), keyframesOnly)
+        if ffmpeg:
+            environ[FFMPEG_OPTIONS_ENV] = ffmpeg
+        try:
+            capture = VideoCapture(source, BACKENDS[backend], params)
+        finally:
+            if ffmpeg:
+                if previous is None:
+                    environ.pop(FFMPEG_OPTIONS_ENV, None)
+                else:
+                    environ[FFMPEG_OPTIONS_ENV] = previous
+
+    if bufferSize > 0:
+        capture.set(CAP_PROP_BUFFERSIZE, bufferSize)
+
+    logger.info(
+        "[%s] capture %s %dx%d @ %.1f fps",
+        name or source,
+        capture.getBackendName() if capture.isOpened() else "closed",
+        int(capture.get(CAP_PROP_FRAME_WIDTH)),
+        int(capture.get(CAP_PROP_FRAME_HEIGHT)),
+        capture.get(CAP_PROP_FPS),
+    )
+    return capture
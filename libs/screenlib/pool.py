@@ -0,0 +1,66 @@
+from threading import Lock
+
+from cv2.typing import MatLike
+from numpy import empty, uint8
+
+
+class FramePool:
+    def __init__(self, shape: tuple[int, int, int], maxSize: int = 16) -> None:
+        if maxSize <= 0:
+            raise ValueError("maxSize must be greater than 0")
+
+        self._shape: tuple[int, int, int] = tuple(shape)
+        self._maxSize: int = maxSize
+        self._lock: Lock = Lock()
+        self._free: list[MatLike] = list()
+        # id -> [buffer, holders], the buffer itself keeps its id from being reused
+        self._inUse: dict[int, list] = dict()
+        self._allocations: int = 0
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self._shape
+
+    @property
+    def size(self) -> int:
+        return len(self._free) + len(self._inUse)
+
+    @property
+    def allocations(self) -> int:
+        return self._allocations
+
+    def acquire(self, shape: tuple[int, int, int] | None = None) -> MatLike:
+        with self._lock:
+            if shape is not None and tuple(shape) != self._shape:
+                self._shape = tuple(shape)
+                self._free.clear()
+
+            if self._free:
+                buffer = self._free.pop()
+            else:
+                self._allocations += 1
+                buffer = empty(self._shape, dtype=uint8)
+            self._inUse[id(buffer)] = [buffer, 1]
+            return buffer
+
+    def retain(self, buffer: MatLike) -> None:
+        # every extra holder (a queue, the displayed frame) takes its own reference
+        with self._lock:
+            entry = self._inUse.get(id(buffer))
+            if entry is not None and entry[0] is buffer:
+                entry[1] += 1
+
+    def release(self, buffer: MatLike | None) -> None:
+        # buffers the pool never handed out are ignored, callers need not check
+        if buffer is None:
+            return
+        with self._lock:
+            entry = self._inUse.get(id(buffer))
+            if entry is None or entry[0] is not buffer:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._inUse[id(buffer)]
+            if buffer.shape == self._shape and len(self._free) < self._maxSize:
+                self._free.append(buffer)
@@ -0,0 +1,82 @@
+from threading import Lock
+
+from cv2.typing import MatLike
+from numpy import copyto, empty, zeros, float64, int64, uint8
+
+
+class FrameRing:
+    def __init__(self, shape: tuple[int, int, int], capacity: int = 3) -> None:
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+
+        self._capacity: int = capacity
+        self._lock: Lock = Lock()
+        self._head: int = -1
+        self._seq: int = 0
+        self._lastReadSeq: int = 0
+        self._dropped: int = 0
+        self._allocate(shape)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self._shape
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def droppedFrames(self) -> int:
+        return self._dropped
+
+    @property
+    def empty(self) -> bool:
+        return self._head < 0
+
+    def _allocate(self, shape: tuple[int, int, int]) -> None:
+        self._shape: tuple[int, int, int] = tuple(shape)
+        self._frames = zeros((self._capacity, *shape), dtype=uint8)
+        self._timestamps = empty(self._capacity, dtype=float64)
+        self._seqs = zeros(self._capacity, dtype=int64)
+
+    def nextSlot(self, shape: tuple[int, int, int] | None = None) -> MatLike:
+        # the published head is never handed out for writing,
+        # so readers always copy a complete frame
+        if shape is not None and tuple(shape) != self._shape:
+            with self._lock:
+                self._allocate(shape)
+                self._head = -1
+        return self._frames[(self._head + 1) % self._capacity]
+
+    def publish(self, timestamp: float) -> int:
+        with self._lock:
+            if self._seq > self._lastReadSeq:
+                self._dropped += 1
+
+            self._head = (self._head + 1) % self._capacity
+            self._seq += 1
+            self._timestamps[self._head] = timestamp
+            self._seqs[self._head] = self._seq
+            return self._seq
+
+    def write(self, frame: MatLike, timestamp: float) -> int:
+        slot = self.nextSlot(frame.shape)
+        slot[...] = frame
+        return self.publish(timestamp)
+
+    def latest(self, out: MatLike | None = None) -> tuple[MatLike | None, float, int]:
+        with self._lock:
+            if self._head < 0:
+                return None, 0.0, 0
+
+            self._lastReadSeq = int(self._seqs[self._head])
+            frame = self._frames[self._head]
+            if out is None or out.shape != frame.shape:
+                out = frame.copy()
+            else:
+                copyto(out, frame)
+            return out, float(self._timestamps[self._head]), self._lastReadSeq
@@ -1,11 +1,63 @@
 from cv2.typing import MatLike
-from cv2 import VideoWriter, VideoCapture, cvtColor, imshow, resize, COLOR_BGR2RGB
-from typing import Callable
-from PySide6.QtGui import QImage
-from numpy import empty
+from cv2 import VideoWriter, VideoCapture, imshow, resize, INTER_AREA
+from cv2 import CAP_PROP_POS_MSEC
+from typing import Callable, TYPE_CHECKING
+from collections import deque
+from numpy import copyto, empty
 from typing import Optional
-from time import time
-import pafy
+from time import time, perf_counter, monotonic
+from threading import BoundedSemaphore, Event, Lock, Thread
+from logging import getLogger
+from random import uniform
+from os.path import isfile
+
+from libs.sinklib.recorder import AsyncRecorder
+from libs.metricslib.stats import StageStats
+from .ring import FrameRing
+from .pool import FramePool
+from .capture import openCapture
+from .shmring import SharedFrameRing
+from .sources import SourceResolver, defaultResolver, isWebSource
+
+if TYPE_CHECKING:
+    from PySide6.QtGui import QImage
+
+logger = getLogger(__name__)
+
+HEALTH_STATES: tuple = ("connected", "stalled", "reconnecting", "ended")
+
+# reopening streams is slow and hits the network, cap how many run at once
+_reconnectSlots: BoundedSemaphore = BoundedSemaphore(4)
+
+
+def setReconnectLimit(limit: int) -> None:
+    global _reconnectSlots
+    if limit <= 0:
+        raise ValueError("limit must be greater than 0")
+    _reconnectSlots = BoundedSemaphore(limit)
+
+
+def fitSize(shape: tuple, size: tuple[int, int]) -> tuple[int, int]:
+    # largest size inside `size` that keeps the frame's aspect ratio
+    h, w = shape[:2]
+    ratio = min(size[0] / w, size[1] / h)
+    return max(int(w * ratio), 1), max(int(h * ratio), 1)
+
+
+def toQImage(image: MatLike, size: tuple[int, int] | None = None) -> "QImage":
+    # Qt is only needed by the GUI, keep it out of headless startup
+    from PySide6.QtGui import QImage
+
+    if size is not None:
+        target = fitSize(image.shape, size)
+        if target != (image.shape[1], image.shape[0]):
+            image = resize(image, target, interpolation=INTER_AREA)
+
+    # wrap the BGR pixels as they are, the one conversion gives Qt its own copy
+    # so the frame can go back to its pool
+    h, w, _ = image.shape
+    img = QImage(image.data, w, h, image.strides[0], QImage.Format.Format_BGR888)
+    return img.convertToFormat(QImage.Format.Format_RGB888)
 
 
 class Screen:
@@ -17,43 +69,141 @@ class Screen:
         output: str = "",
         fourcc: str = "XVID",
         fps: int = 24,
+        bufferSize: int = 3,
+        clock: str = "auto",
+        captureOptions: dict | None = None,
+        reconnectOptions: dict | None = None,
+        resolver: SourceResolver | None = None,
     ):
         self._filterFuncs: list = list()
+        self._calls: deque = deque()
+        self._renderAnnotations: bool = True
         self._name: str = name
         self._output: str = output
 
-        if "youtu" in source:
-            video = pafy.new(source)
-            best = video.getbest(preftype="mp4")
-            if best is None:
-                raise ValueError(f"Video source {source} not found")
-            source = best.url
+        # web pages resolve to a stream url that expires, the resolver caches it
+        # and hands over a fresh one before it does
+        self._resolver: SourceResolver = resolver or defaultResolver()
+        self._webSource: str = source if isWebSource(source) else ""
+        resolved = True
+        try:
+            source = self._resolver.resolve(source)
+        except Exception:
+            # like a camera that is down, start unopened and let reconnect retry
+            logger.exception("[%s] resolving %s failed", name, source)
+            resolved = False
+        self._pendingCapture: VideoCapture | None = None
 
-        self._captureSource: VideoCapture = VideoCapture(source)
+        if clock not in ("auto", "stream", "wall"):
+            raise ValueError(f"clock must be auto, stream or wall, receive '{clock}'")
+        # recorded files are timed by their own PTS so replay speed doesn't matter
+        self._streamClock: bool = clock == "stream" or (
+            clock == "auto" and isfile(source)
+        )
+
+        reconnectOptions = reconnectOptions or dict()
+        self._source: str = source
+        # recorded files end, they are never reconnected
+        self._reconnect: bool = not isfile(source) and bool(
+            reconnectOptions.get("enabled", True)
+        )
+        self._staleTimeout: float = float(reconnectOptions.get("staleTimeout", 5.0))
+        self._backoff: float = float(reconnectOptions.get("backoff", 1.0))
+        self._maxBackoff: float = float(reconnectOptions.get("maxBackoff", 30.0))
+        self._jitter: float = float(reconnectOptions.get("jitter", 0.25))
+        if self._staleTimeout <= 0 or self._backoff <= 0:
+            raise ValueError("staleTimeout and backoff must be greater than 0")
+        self._attempts: int = 0
+        self._reconnects: int = 0
+
+        self._captureOptions: dict = dict(captureOptions or dict())
+        if self._reconnect:
+            # a blocked read would hide a dead stream from the stale check
+            self._captureOptions.setdefault("readTimeout", self._staleTimeout)
+        self._captureSource: VideoCapture = (
+            openCapture(source, self._captureOptions, name)
+            if resolved
+            else VideoCapture()
+        )
+        self._state: str = "connected" if self._captureSource.isOpened() else "reconnecting"
+        self._lastFrameAt: float = monotonic()
+        if self._webSource:
+            self._resolver.subscribe(self._webSource, self._refreshSource)
         self._scale: float = scale
+        width, height = self._captureSize()
         self._resolution: tuple[int, int] = (
-            int(self._captureSource.get(3) * self._scale),
-            int(self._captureSource.get(4) * self._scale),
+            int(width * self._scale),
+            int(height * self._scale),
         )
         self._lastTimeUpdate: float = time()
-        self._originScreenBuffer: MatLike = empty(list(self._resolution[::-1]) + [3])
+        self._frameRing: FrameRing = FrameRing(
+            (self._resolution[1], self._resolution[0], 3), capacity=bufferSize
+        )
+        self._framePool: FramePool = FramePool(self._frameRing.shape)
+        self._sharedRing: SharedFrameRing | None = None
+        self._sharedName: str = ""
+        self._sharedCapacity: int = 3
+        self._sharedOrigin: bool = True
+        self._sharedLock: Lock = Lock()
+        self._captureThread: Thread | None = None
+        self._captureStop: Event = Event()
+        self._bufferLock: Lock = Lock()
+        self._closing: bool = False
+        self._stats: StageStats = StageStats()
         self._filterScreenBuffer: MatLike = empty(list(self._resolution[::-1]) + [3])
         self._fourcc: int = VideoWriter.fourcc(*fourcc)
         self._recordFPS: int = fps
-        self._outSource: Optional[VideoWriter] = (
-            VideoWriter(output, self._fourcc, self._recordFPS, self._resolution)
-            if self._output
-            else None
-        )
+        self._recordOrigin: bool = True
+        self._recordOptions: dict = dict()
+        self._outSource: Optional[AsyncRecorder] = None
+        self.setupOutSource(output, fourcc, fps)
 
     @property
     def originScreenBuffer(self) -> MatLike:
-        return self._originScreenBuffer
+        frame, _, _ = self._frameRing.latest()
+        return frame if frame is not None else self._frameRing.nextSlot()
+
+    @property
+    def frameRing(self) -> FrameRing:
+        return self._frameRing
+
+    @property
+    def droppedFrames(self) -> int:
+        return self._frameRing.droppedFrames
+
+    @property
+    def stats(self) -> StageStats:
+        return self._stats
+
+    @property
+    def health(self) -> str:
+        if (
+            self._state == "connected"
+            and monotonic() - self._lastFrameAt > self._staleTimeout
+        ):
+            return "stalled"
+        return self._state
+
+    @property
+    def reconnects(self) -> int:
+        return self._reconnects
+
+    @property
+    def capturing(self) -> bool:
+        return self._captureThread is not None and self._captureThread.is_alive()
 
     @property
     def name(self) -> str:
         return self._name
 
+    @property
+    def recorder(self) -> AsyncRecorder | None:
+        return self._outSource
+
+    @property
+    def sharedRing(self) -> SharedFrameRing | None:
+        return self._sharedRing
+
     @property
     def scale(self) -> float:
         return self._scale
@@ -74,17 +224,51 @@ class Screen:
                 int(self._resolution[1] * self._scale),
             )
             self._resolution = newRes
-            self.setupOutSource(self._output, self._fourcc, self._recordFPS)
+            self.setupOutSource(
+                self._output, self._fourcc, self._recordFPS, **self._recordOptions
+            )
         self._scale = value
 
     @filterScreenBuffer.setter
     def filterScreenBuffer(self, value: MatLike):
-        self._filterScreenBuffer = value
+        self._setFilterScreenBuffer(value)
+
+    def _setFilterScreenBuffer(self, buffer: MatLike) -> None:
+        # the screen holds its own reference on the frame it displays
+        self._framePool.retain(buffer)
+        with self._bufferLock:
+            previous, self._filterScreenBuffer = self._filterScreenBuffer, buffer
+        self._framePool.release(previous)
+
+    def retainFilterScreenBuffer(self) -> MatLike:
+        # for readers on other threads, hand it back with releaseFrame when done
+        with self._bufferLock:
+            buffer = self._filterScreenBuffer
+            self._framePool.retain(buffer)
+        return buffer
+
+    def releaseFrame(self, frame: MatLike | None) -> None:
+        # frames from latestFrame and retainFilterScreenBuffer go back to the pool
+        self._framePool.release(frame)
 
     def setupOutSource(
-        self, output: str | None, fourcc: str | int = "XVID", fps: int = 24
+        self,
+        output: str | None,
+        fourcc: str | int = "XVID",
+        fps: int = 24,
+        origin: bool = True,
+        queueSize: int = 32,
+        policy: str = "drop",
+        segmentSeconds: float = 0.0,
+        segmentBytes: int = 0,
     ) -> None:
         if not output:
+            # recording removed, stop the one that is running
+            recorder, self._outSource = self._outSource, None
+            self._output = ""
+            self._recordOrigin = True
+            if recorder is not None:
+                recorder.close()
             return
 
         self._fourcc: int = (
@@ -92,50 +276,359 @@ class Screen:
         )
         self._recordFPS: int = fps
         self._output: str = output
+        self._recordOrigin = origin
+        self._recordOptions = dict(
+            origin=origin,
+            queueSize=queueSize,
+            policy=policy,
+            segmentSeconds=segmentSeconds,
+            segmentBytes=segmentBytes,
+        )
+
+        if self._outSource is not None:
+            self._outSource.close()
 
-        self._outSource: Optional[VideoWriter] = VideoWriter(
-            self._output, self._fourcc, self._recordFPS, self._resolution
+        # encoding happens on the recorder's own thread, never in the frame loop
+        self._outSource: Optional[AsyncRecorder] = AsyncRecorder(
+            self._output,
+            self._resolution,
+            fourcc=self._fourcc,
+            fps=self._recordFPS,
+            queueSize=queueSize,
+            policy=policy,
+            segmentSeconds=segmentSeconds,
+            segmentBytes=segmentBytes,
+            release=self._framePool.release,
         )
 
+    def setupShared(self, name: str, capacity: int = 3, origin: bool = True) -> None:
+        with self._sharedLock:
+            if (name, capacity) != (self._sharedName, self._sharedCapacity):
+                # removed or renamed, the next frame publishes a fresh block
+                if self._sharedRing is not None:
+                    self._sharedRing.close()
+                    self._sharedRing = None
+            self._sharedName = name
+            self._sharedCapacity = capacity
+            self._sharedOrigin = origin if name else True
+
+    def _publishShared(self, frame: MatLike, timestamp: float) -> None:
+        if not self._sharedName:
+            return
+
+        # capture and filter threads publish, a reload may swap the ring
+        with self._sharedLock:
+            self._publishSharedLocked(frame, timestamp)
+
+    def _publishSharedLocked(self, frame: MatLike, timestamp: float) -> None:
+        if not self._sharedName:
+            return
+
+        ring = self._sharedRing
+        if ring is None or ring.shape != frame.shape:
+            if ring is not None:
+                ring.close()
+            ring = SharedFrameRing.create(
+                self._sharedName, frame.shape, self._sharedCapacity
+            )
+            self._sharedRing = ring
+        ring.write(frame, timestamp)
+
     def update(self) -> bool:
         ret = self.getNextFrame()
-        if self._outSource is not None:
-            self._outSource.write(self._originScreenBuffer)
-        self.applyFilter()
+        frame, timestamp, _ = self.latestFrame()
+        if frame is None:
+            return ret
+        self.applyFilter(frame, timestamp)
+        self.releaseFrame(frame)
         return ret
 
+    def record(self, frame: MatLike, timestamp: float | None = None) -> None:
+        recorder = self._outSource
+        if recorder is not None:
+            # the recorder releases it once encoded or dropped
+            self._framePool.retain(frame)
+            recorder.write(frame, timestamp if timestamp is not None else time())
+
     def run(self, windowName: str, display: bool = False, origin: bool = False):
         self.update()
         self.displayScreen(windowName, origin) if display else None
 
     def displayScreen(self, windowName: str, origin: bool = False):
-        frame = self._originScreenBuffer if origin else self._filterScreenBuffer
+        if origin:
+            imshow(windowName, self.originScreenBuffer)
+            return
+        frame = self.retainFilterScreenBuffer()
         imshow(windowName, frame)
+        self.releaseFrame(frame)
 
     def getNextFrame(self) -> bool:
-        ret, self._originScreenBuffer = self._captureSource.read()
-        if not ret:
-            return ret
-        self._originScreenBuffer = resize(self._originScreenBuffer, self._resolution)
-        # self._filterScreenBuffer = self._originScreenBuffer
+        slot = self._frameRing.nextSlot((self._resolution[1], self._resolution[0], 3))
+
+        beginTime = perf_counter()
+        if self._scale == 1.0:
+            # decode straight into the ring slot, nothing to resize
+            ret, frame = self._captureSource.read(slot)
+            if not ret:
+                return ret
+            decodeTime = perf_counter()
+            if frame.shape != slot.shape:
+                resize(frame, self._resolution, dst=slot)
+            elif frame.ctypes.data != slot.ctypes.data:
+                copyto(slot, frame)
+        else:
+            ret, frame = self._captureSource.read()
+            if not ret:
+                return ret
+            decodeTime = perf_counter()
+            resize(frame, self._resolution, dst=slot)
+        self._stats.record("decode", decodeTime - beginTime)
+        self._stats.record("resize", perf_counter() - decodeTime)
+
+        timestamp = self._frameTime()
+        self._frameRing.publish(timestamp)
+        if self._sharedOrigin:
+            self._publishShared(slot, timestamp)
         return ret
 
-    def getQImage(self, origin: bool = True) -> QImage:
-        image = self._originScreenBuffer if origin else self._filterScreenBuffer
-        image = cvtColor(image, COLOR_BGR2RGB)
-        h, w, ch = image.shape
-        img = QImage(image.data, w, h, ch * w, QImage.Format.Format_RGB888)
-        return img
+    def _frameTime(self) -> float:
+        if self._streamClock:
+            return self._captureSource.get(CAP_PROP_POS_MSEC) / 1000
+        return time()
+
+    def latestFrame(self) -> tuple[MatLike | None, float, int]:
+        return self._frameRing.latest(out=self._framePool.acquire(self._frameRing.shape))
+
+    def startCapture(self) -> None:
+        if self.capturing:
+            return
+        self._captureStop.clear()
+        self._captureThread = Thread(
+            target=self._captureLoop, name=f"capture-{self._name}", daemon=True
+        )
+        self._captureThread.start()
+
+    def stopCapture(self, timeout: float | None = None) -> None:
+        self._captureStop.set()
+        if self._captureThread is not None:
+            self._captureThread.join(timeout)
+            # still inside read() or openCapture, keep it so capturing stays true
+            if not self._captureThread.is_alive():
+                self._captureThread = None
+
+    def _releaseCapture(self) -> None:
+        if self._pendingCapture is not None:
+            self._pendingCapture.release()
+            self._pendingCapture = None
+        self._captureSource.release()
+
+    def _captureLoop(self) -> None:
+        try:
+            self._runCapture()
+        finally:
+            # the thread owns the source, close() leaves it alone while we run
+            if self._closing:
+                self._releaseCapture()
+
+    def _runCapture(self) -> None:
+        # each screen reads on its own thread so a stalled source only stalls itself
+        while not self._captureStop.is_set():
+            if self._pendingCapture is not None:
+                self._swapCapture()
+            if self._captureSource.isOpened() and self.getNextFrame():
+                self._lastFrameAt = monotonic()
+                self._attempts = 0
+                self._state = "connected"
+                continue
+
+            if not self._reconnect:
+                self._state = "ended"
+                self._captureStop.wait(0.1)
+                continue
+
+            idle = monotonic() - self._lastFrameAt
+            if self._captureSource.isOpened() and idle < self._staleTimeout:
+                self._state = "stalled"
+                self._captureStop.wait(0.01)
+                continue
+
+            self._reopen()
+
+    def _captureSize(self) -> tuple[float, float]:
+        # a requested capture size wins, backends without a scaler decode at full
+        # size and getNextFrame resizes into the ring slot
+        width = float(self._captureOptions.get("width", 0))
+        height = float(self._captureOptions.get("height", 0))
+        if width > 0 and height > 0:
+            return width, height
+        return self._captureSource.get(3), self._captureSource.get(4)
+
+    def _refreshSource(self, url: str) -> None:
+        # runs on the resolver thread, the old stream keeps playing while this opens
+        capture = openCapture(url, self._captureOptions, self._name)
+        if not capture.isOpened():
+            logger.warning("[%s] refreshed url did not open, keeping the old one", self._name)
+            capture.release()
+            return
+        self._source = url
+        previous, self._pendingCapture = self._pendingCapture, capture
+        if previous is not None:
+            previous.release()
+
+    def _swapCapture(self) -> None:
+        capture, self._pendingCapture = self._pendingCapture, None
+        if capture is None:
+            return
+        self._captureSource.release()
+        self._captureSource = capture
+        self._lastFrameAt = monotonic()
+
+    def _reconnectDelay(self) -> float:
+        delay = min(self._backoff * 2**self._attempts, self._maxBackoff)
+        # spread retries out so cameras behind one switch don't reconnect in lockstep
+        return delay * uniform(1 - self._jitter, 1 + self._jitter)
+
+    def _reopen(self) -> None:
+        self._state = "reconnecting"
+        delay = self._reconnectDelay()
+        self._attempts += 1
+        logger.warning(
+            "[%s] no frame for %.1fs, reconnect attempt %d in %.1fs",
+            self._name,
+            monotonic() - self._lastFrameAt,
+            self._attempts,
+            delay,
+        )
+        if self._captureStop.wait(delay):
+            return
+
+        with _reconnectSlots:
+            if self._captureStop.is_set():
+                return
+            self._captureSource.release()
+            if self._webSource:
+                # the stream url may be what expired, cached unless it has
+                try:
+                    self._source = self._resolver.resolve(self._webSource)
+                except Exception:
+                    logger.exception("[%s] resolving %s failed", self._name, self._webSource)
+                    return
+            capture = openCapture(self._source, self._captureOptions, self._name)
+            if self._captureStop.is_set():
+                # closed while the stream was opening
+                capture.release()
+                return
+            self._captureSource = capture
+
+        if not self._captureSource.isOpened():
+            return
+
+        # the camera may come back at another size, or was never up at startup
+        width, height = self._captureSize()
+        if width > 0 and height > 0:
+            self._resolution = (int(width * self._scale), int(height * self._scale))
+        self._reconnects += 1
+        self._lastFrameAt = monotonic()
+        self._state = "connected"
+
+    def getQImage(
+        self, origin: bool = True, size: tuple[int, int] | None = None
+    ) -> "QImage":
+        if origin:
+            return toQImage(self.originScreenBuffer, size)
+        image = self.retainFilterScreenBuffer()
+        try:
+            return toQImage(image, size)
+        finally:
+            self.releaseFrame(image)
+
+    @property
+    def renderAnnotations(self) -> bool:
+        return self._renderAnnotations
+
+    @renderAnnotations.setter
+    def renderAnnotations(self, value: bool) -> None:
+        self._renderAnnotations = value
+
+    @property
+    def outputsFiltered(self) -> bool:
+        # the recorder or shared ring takes the annotated frame
+        recording = self._outSource is not None and not self._recordOrigin
+        sharing = bool(self._sharedName) and not self._sharedOrigin
+        return recording or sharing
+
+    @property
+    def filters(self) -> list[Callable]:
+        return [func for func, _ in self._filterFuncs]
 
     def addFilter(self, filter: Callable, **kwargs):
         self._filterFuncs.append((filter, kwargs))
 
-    def applyFilter(self):
-        self._filterScreenBuffer = self._originScreenBuffer.copy()
+    def setFilters(self, filters: list[Callable]) -> None:
+        self._filterFuncs = [(func, dict()) for func in filters]
+
+    def callSoon(self, func: Callable, *args) -> None:
+        # runs on the filtering thread before the next frame, so filter state is
+        # never changed halfway through drawing
+        self._calls.append((func, args))
+
+    def _runCalls(self) -> None:
+        while self._calls:
+            func, args = self._calls.popleft()
+            func(*args)
+
+    def applyFilter(self, frame: MatLike | None = None, timestamp: float | None = None):
+        self._runCalls()
+        owned: MatLike | None = None
+        if frame is None:
+            frame, timestamp, _ = self.latestFrame()
+            owned = frame
+            frame = self._frameRing.nextSlot() if frame is None else frame
+
+        # draw on the frame itself unless a filter allocates or the untouched
+        # frame is still wanted by the recorder, then copy once into the pool
+        inplace = all(getattr(func, "inplace", False) for func, _ in self._filterFuncs)
+        keepOrigin = self._outSource is not None and self._recordOrigin
+        copied: MatLike | None = None
+        if inplace and not keepOrigin:
+            buffer = frame
+        else:
+            buffer = copied = self._framePool.acquire(frame.shape)
+            copyto(buffer, frame)
+
         for func, params in self._filterFuncs:
-            self._filterScreenBuffer = func(self._filterScreenBuffer, **params)
+            # nobody will see this frame, keep the state filters and skip drawing
+            if not self._renderAnnotations and getattr(func, "annotation", False):
+                continue
+            beginTime = perf_counter()
+            buffer = func(buffer, timestamp=timestamp, **params)
+            self._stats.record(f"filter:{func.__name__}", perf_counter() - beginTime)
+        self._setFilterScreenBuffer(buffer)
+
+        beginTime = perf_counter()
+        self.record(frame if self._recordOrigin else buffer, timestamp)
+        if not self._sharedOrigin:
+            self._publishShared(buffer, timestamp if timestamp is not None else time())
+        self._stats.record("output", perf_counter() - beginTime)
+        self._framePool.release(copied)
+        self._framePool.release(owned)
 
     def close(self):
+        self._closing = True
+        self.stopCapture(timeout=1.0)
+        if self._webSource:
+            self._resolver.unsubscribe(self._webSource, self._refreshSource)
         if self._outSource:
-            self._outSource.release()
-        self._captureSource.release()
+            self._outSource.close()
+        with self._sharedLock:
+            if self._sharedRing is not None:
+                self._sharedRing.close()
+                self._sharedRing = None
+            # a frame still in flight must not publish a new block after close
+            self._sharedName = ""
+        if self._captureThread is None:
+            self._releaseCapture()
+        else:
+            logger.warning(
+                "[%s] capture thread still busy, it releases the source on exit", self._name
+            )
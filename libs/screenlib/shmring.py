@@ -0,0 +1,183 @@
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from secrets import randbits
+from time import monotonic, sleep
+
+from cv2.typing import MatLike
+from numpy import float64, int64, ndarray, uint8, prod
+
+# header: capacity, height, width, channels, head, seq, token
+_HEADER: int = 7
+_CAPACITY, _HEIGHT, _WIDTH, _CHANNELS, _HEAD, _SEQ, _TOKEN = range(_HEADER)
+
+# name -> token of the newest block this process created under it
+_owners: dict[str, int] = dict()
+
+
+class SharedFrameRing:
+    def __init__(self, memory: SharedMemory, owner: bool) -> None:
+        self._memory: SharedMemory = memory
+        self._owner: bool = owner
+
+        header = ndarray((_HEADER,), dtype=int64, buffer=memory.buf)
+        self._header: ndarray = header
+        capacity = int(header[_CAPACITY])
+        shape = (int(header[_HEIGHT]), int(header[_WIDTH]), int(header[_CHANNELS]))
+
+        offset = header.nbytes
+        # per-slot sequence number, negative while the writer is filling the slot
+        self._slotSeqs = ndarray((capacity,), dtype=int64, buffer=memory.buf, offset=offset)
+        offset += self._slotSeqs.nbytes
+        self._timestamps = ndarray(
+            (capacity,), dtype=float64, buffer=memory.buf, offset=offset
+        )
+        offset += self._timestamps.nbytes
+        self._frames = ndarray(
+            (capacity, *shape), dtype=uint8, buffer=memory.buf, offset=offset
+        )
+        self._capacity: int = capacity
+        self._shape: tuple[int, int, int] = shape
+        self._token: int = int(header[_TOKEN])
+
+    @classmethod
+    def create(
+        cls,
+        name: str,
+        shape: tuple[int, int, int],
+        capacity: int = 3,
+        replace: bool = True,
+    ) -> "SharedFrameRing":
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+
+        size = (
+            _HEADER * 8 + capacity * 8 + capacity * 8 + capacity * int(prod(shape))
+        )
+        try:
+            memory = SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            if not replace:
+                raise
+            # left behind by a process that died without unlinking
+            stale = SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            memory = SharedMemory(name=name, create=True, size=size)
+        header = ndarray((_HEADER,), dtype=int64, buffer=memory.buf)
+        # tells this block apart from a later one created under the same name
+        header[:] = (capacity, *shape, -1, 0, randbits(62))
+        del header
+        ring = cls(memory, owner=True)
+        ring._slotSeqs[:] = 0
+        _owners[name] = ring._token
+        return ring
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedFrameRing":
+        memory = SharedMemory(name=name)
+        # only the creating process may unlink the block
+        resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory, owner=False)
+
+    @classmethod
+    def waitFor(cls, name: str, timeout: float = 10.0) -> "SharedFrameRing":
+        # readers may start before the publishing screen has its first frame
+        deadline = monotonic() + timeout
+        while True:
+            try:
+                return cls.attach(name)
+            except FileNotFoundError:
+                if monotonic() >= deadline:
+                    raise
+                sleep(0.1)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self._shape
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def seq(self) -> int:
+        return int(self._header[_SEQ])
+
+    def write(self, frame: MatLike, timestamp: float) -> int:
+        if frame.shape != self._shape:
+            raise ValueError(f"frame shape {frame.shape} does not match ring {self._shape}")
+
+        # single writer: fill the slot after head, then publish it
+        slot = (int(self._header[_HEAD]) + 1) % self._capacity
+        seq = int(self._header[_SEQ]) + 1
+        self._slotSeqs[slot] = -seq
+        self._frames[slot][...] = frame
+        self._timestamps[slot] = timestamp
+        self._slotSeqs[slot] = seq
+        self._header[_HEAD] = slot
+        self._header[_SEQ] = seq
+        return seq
+
+    def latest(
+        self, out: MatLike | None = None, copy: bool = True
+    ) -> tuple[MatLike | None, float, int]:
+        for _ in range(3):
+            slot = int(self._header[_HEAD])
+            if slot < 0:
+                return None, 0.0, 0
+
+            seq = int(self._slotSeqs[slot])
+            if seq <= 0:
+                continue
+            if not copy:
+                # view into shared memory, check valid(seq) before trusting it
+                return self._frames[slot], float(self._timestamps[slot]), seq
+
+            frame = self._frames[slot]
+            if out is None or out.shape != frame.shape:
+                out = frame.copy()
+            else:
+                out[...] = frame
+            timestamp = float(self._timestamps[slot])
+
+            # the writer lapped us while copying, try the new head
+            if int(self._slotSeqs[slot]) == seq:
+                return out, timestamp, seq
+        return None, 0.0, 0
+
+    def valid(self, seq: int) -> bool:
+        return seq > 0 and bool((self._slotSeqs == seq).any())
+
+    def _stillNamed(self) -> bool:
+        # another process may have replaced this block under the same name
+        try:
+            current = SharedMemory(name=self._memory.name)
+        except FileNotFoundError:
+            return False
+        header = ndarray((_HEADER,), dtype=int64, buffer=current.buf)
+        token = int(header[_TOKEN])
+        del header
+        current.close()
+        return token == self._token
+
+    def _release(self) -> None:
+        name = self._memory.name
+        if _owners.get(name, self._token) != self._token:
+            # a newer ring in this process owns the name and its tracker entry
+            return
+        _owners.pop(name, None)
+        if self._stillNamed():
+            self._memory.unlink()
+        else:
+            resource_tracker.unregister(self._memory._name, "shared_memory")
+
+    def close(self) -> None:
+        # numpy views must go before the buffer can be released
+        del self._header, self._slotSeqs, self._timestamps, self._frames
+        if self._owner:
+            self._release()
+        self._memory.close()
@@ -0,0 +1,168 @@
+from json import dump, load
+from logging import getLogger
+from os import makedirs, replace
+from os.path import dirname, isfile
+from threading import Event, Lock, Thread
+from time import time
+from typing import Callable
+from urllib.parse import parse_qs, urlparse
+
+logger = getLogger(__name__)
+
+
+def isWebSource(source: str) -> bool:
+    return "youtu" in source
+
+
+def _lookup(source: str) -> str:
+    # pafy pulls in youtube-dl, only web sources need it
+    import pafy
+
+    best = pafy.new(source).getbest(preftype="mp4")
+    if best is None:
+        raise ValueError(f"Video source {source} not found")
+    return best.url
+
+
+def _urlExpiry(url: str) -> float | None:
+    # googlevideo urls say when they stop working
+    expire = parse_qs(urlparse(url).query).get("expire")
+    try:
+        return float(expire[0]) if expire else None
+    except ValueError:
+        return None
+
+
+class SourceResolver:
+    def __init__(
+        self,
+        cachePath: str = "",
+        ttl: float = 3600.0,
+        refreshMargin: float = 300.0,
+        checkInterval: float = 30.0,
+        lookup: Callable[[str], str] = _lookup,
+    ) -> None:
+        if ttl <= 0:
+            raise ValueError("ttl must be greater than 0")
+        if refreshMargin >= ttl:
+            raise ValueError("refreshMargin must be less than ttl")
+
+        self._cachePath: str = cachePath
+        self._ttl: float = ttl
+        self._refreshMargin: float = refreshMargin
+        self._checkInterval: float = checkInterval
+        self._lookup: Callable[[str], str] = lookup
+        self._lock: Lock = Lock()
+        # screens resolve in parallel, one writer at a time owns the temp file
+        self._writeLock: Lock = Lock()
+        # source -> {"url": resolved url, "expires": epoch seconds}
+        self._entries: dict[str, dict] = self._readCache()
+        self._subscribers: dict[str, list[Callable[[str], None]]] = dict()
+        self._stopEvent: Event = Event()
+        self._thread: Thread | None = None
+
+    def _readCache(self) -> dict[str, dict]:
+        if not self._cachePath or not isfile(self._cachePath):
+            return dict()
+        try:
+            with open(self._cachePath) as file:
+                entries = load(file)
+        except (OSError, ValueError):
+            logger.warning("source cache %s unreadable, starting empty", self._cachePath)
+            return dict()
+        now = time()
+        return {key: entry for key, entry in entries.items() if entry["expires"] > now}
+
+    def _writeCache(self) -> None:
+        if not self._cachePath:
+            return
+        if dirname(self._cachePath):
+            makedirs(dirname(self._cachePath), exist_ok=True)
+
+        # write then rename, a crash mid-write never leaves a broken cache
+        tmpPath = f"{self._cachePath}.tmp"
+        with self._writeLock:
+            with self._lock:
+                entries = dict(self._entries)
+            try:
+                with open(tmpPath, "w") as file:
+                    dump(entries, file, indent=1)
+                replace(tmpPath, self._cachePath)
+            except OSError:
+                # the url is resolved either way, only the next start pays again
+                logger.warning("source cache %s not written", self._cachePath, exc_info=True)
+
+    def expiresAt(self, source: str) -> float:
+        entry = self._entries.get(source)
+        return entry["expires"] if entry is not None else 0.0
+
+    def resolve(self, source: str, force: bool = False) -> str:
+        if not isWebSource(source):
+            return source
+
+        entry = self._entries.get(source)
+        if not force and entry is not None and entry["expires"] > time():
+            return entry["url"]
+
+        url = self._lookup(source)
+        expires = time() + self._ttl
+        urlExpiry = _urlExpiry(url)
+        if urlExpiry is not None:
+            expires = min(expires, urlExpiry)
+        with self._lock:
+            self._entries[source] = {"url": url, "expires": expires}
+        self._writeCache()
+        return url
+
+    def subscribe(self, source: str, callback: Callable[[str], None]) -> None:
+        if not isWebSource(source):
+            return
+        with self._lock:
+            self._subscribers.setdefault(source, list()).append(callback)
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._refreshLoop, name="source-refresh", daemon=True
+                )
+                self._thread.start()
+
+    def unsubscribe(self, source: str, callback: Callable[[str], None]) -> None:
+        with self._lock:
+            callbacks = self._subscribers.get(source, list())
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def _refreshLoop(self) -> None:
+        while not self._stopEvent.wait(self._checkInterval):
+            with self._lock:
+                due = [
+                    (source, list(callbacks))
+                    for source, callbacks in self._subscribers.items()
+                    if callbacks
+                    and self.expiresAt(source) - time() < self._refreshMargin
+                ]
+
+            for source, callbacks in due:
+                # renew before the old url dies so captures can switch with no gap
+                try:
+                    url = self.resolve(source, force=True)
+                except Exception:
+                    logger.exception("refreshing %s failed", source)
+                    continue
+                for callback in callbacks:
+                    callback(url)
+
+    def close(self) -> None:
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+_defaultResolver: SourceResolver | None = None
+
+
+def defaultResolver() -> SourceResolver:
+    global _defaultResolver
+    if _defaultResolver is None:
+        _defaultResolver = SourceResolver()
+    return _defaultResolver
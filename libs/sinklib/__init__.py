@@ -0,0 +1,2 @@
+from .sink import DetectionSink
+from .recorder import AsyncRecorder
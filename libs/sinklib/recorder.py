@@ -0,0 +1,151 @@
+from os.path import getsize, splitext
+from queue import Queue, Full
+from threading import Thread
+from typing import Callable
+
+from cv2 import VideoWriter
+from cv2.typing import MatLike
+
+POLICIES: tuple = ("drop", "block")
+
+
+class AsyncRecorder:
+    def __init__(
+        self,
+        output: str,
+        resolution: tuple[int, int],
+        fourcc: str | int = "XVID",
+        fps: int = 24,
+        queueSize: int = 32,
+        policy: str = "drop",
+        segmentSeconds: float = 0.0,
+        segmentBytes: int = 0,
+        release: Callable[[MatLike], None] | None = None,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, receive '{policy}'")
+        if queueSize <= 0:
+            raise ValueError("queueSize must be greater than 0")
+
+        self._output: str = output
+        self._resolution: tuple[int, int] = resolution
+        self._fourcc: int = (
+            VideoWriter.fourcc(*fourcc) if isinstance(fourcc, str) else fourcc
+        )
+        self._fps: int = fps
+        self._policy: str = policy
+        self._segmentSeconds: float = segmentSeconds
+        self._segmentBytes: int = segmentBytes
+        # hands each frame back to its owner once it is written or dropped
+        self._release: Callable[[MatLike], None] | None = release
+
+        self._queue: Queue = Queue(maxsize=queueSize)
+        self._writer: VideoWriter | None = None
+        self._segment: int = 0
+        self._segmentPath: str = ""
+        self._segmentStart: float | None = None
+        self._segmentFrames: int = 0
+        self._written: int = 0
+        self._dropped: int = 0
+        self._closed: bool = False
+
+        self._thread: Thread = Thread(
+            target=self._writeLoop, name=f"recorder-{output}", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def output(self) -> str:
+        return self._output
+
+    @property
+    def segmentPath(self) -> str:
+        return self._segmentPath
+
+    @property
+    def written(self) -> int:
+        return self._written
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    @property
+    def queueDepth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def segmented(self) -> bool:
+        return self._segmentSeconds > 0 or self._segmentBytes > 0
+
+    def _done(self, frame: MatLike) -> None:
+        if self._release is not None:
+            self._release(frame)
+
+    def write(self, frame: MatLike, timestamp: float) -> bool:
+        if self._closed:
+            self._done(frame)
+            return False
+
+        if self._policy == "block":
+            self._queue.put((frame, timestamp))
+            return True
+
+        # encoder is behind, lose this frame rather than stall capture
+        try:
+            self._queue.put_nowait((frame, timestamp))
+            return True
+        except Full:
+            self._dropped += 1
+            self._done(frame)
+            return False
+
+    def _segmentName(self) -> str:
+        if not self.segmented:
+            return self._output
+        stem, ext = splitext(self._output)
+        return f"{stem}.{self._segment:04d}{ext}"
+
+    def _openSegment(self, timestamp: float) -> None:
+        if self._writer is not None:
+            self._writer.release()
+            self._segment += 1
+
+        self._segmentPath = self._segmentName()
+        self._writer = VideoWriter(
+            self._segmentPath, self._fourcc, self._fps, self._resolution
+        )
+        self._segmentStart = timestamp
+        self._segmentFrames = 0
+
+    def _shouldRoll(self, timestamp: float) -> bool:
+        if self._writer is None:
+            return True
+        elapsed = timestamp - self._segmentStart
+        if self._segmentSeconds > 0 and elapsed >= self._segmentSeconds:
+            return True
+        # stat the file only every second of video
+        if self._segmentBytes > 0 and self._segmentFrames % max(self._fps, 1) == 0:
+            return getsize(self._segmentPath) >= self._segmentBytes
+        return False
+
+    def _writeLoop(self) -> None:
+        while (item := self._queue.get()) is not None:
+            frame, timestamp = item
+            if self._shouldRoll(timestamp):
+                self._openSegment(timestamp)
+            self._writer.write(frame)
+            self._done(frame)
+            self._segmentFrames += 1
+            self._written += 1
+
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def close(self, timeout: float | None = None) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
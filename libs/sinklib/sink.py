@@ -0,0 +1,69 @@
+from json import dumps
+from threading import Lock
+from time import monotonic
+
+
+class DetectionSink:
+    def __init__(
+        self, output: str, flushInterval: float = 1.0, batchSize: int = 512
+    ) -> None:
+        if flushInterval <= 0:
+            raise ValueError("flushInterval must be greater than 0")
+        if batchSize <= 0:
+            raise ValueError("batchSize must be greater than 0")
+
+        self._output: str = output
+        self._flushInterval: float = flushInterval
+        self._batchSize: int = batchSize
+        self._file = open(output, "a", buffering=1 << 16)
+        self._lock: Lock = Lock()
+        self._pending: list[str] = list()
+        self._lastFlush: float = monotonic()
+        self._written: int = 0
+
+    @property
+    def output(self) -> str:
+        return self._output
+
+    @property
+    def written(self) -> int:
+        return self._written
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def write(self, screen: str, frame: int, timestamp: float, records: list[dict]) -> None:
+        lines = [
+            dumps(
+                {"screen": screen, "frame": frame, "t": round(timestamp, 3), **record},
+                separators=(",", ":"),
+            )
+            for record in records
+        ]
+
+        with self._lock:
+            self._pending.extend(lines)
+            due = monotonic() - self._lastFlush >= self._flushInterval
+            if due or len(self._pending) >= self._batchSize:
+                self._flushLocked()
+
+    def _flushLocked(self) -> None:
+        if self._pending:
+            # one write call per batch instead of one per detection
+            self._file.write("\n".join(self._pending) + "\n")
+            self._file.flush()
+            self._written += len(self._pending)
+            self._pending.clear()
+        self._lastFlush = monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flushLocked()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flushLocked()
+            self._file.close()
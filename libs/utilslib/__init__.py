@@ -1 +1 @@
-from .utils import getDictV
+from .utils import getDictV, drawsInPlace, drawsAnnotation
@@ -1,4 +1,4 @@
-from typing import TypeVar, Any
+from typing import TypeVar, Any, Callable
 
 VT = TypeVar("VT")
 
@@ -15,3 +15,15 @@ def getDictV(inDict: dict, key: Any, default: VT) -> VT:
     raise TypeError(
         f"Expected type '{type(default)}' for key '{key}', received value '{v}' with type '{type(v)}'"
     )
+
+
+def drawsInPlace(func: Callable) -> Callable:
+    # marks a filter that draws on the frame it receives and returns that same frame
+    func.inplace = True
+    return func
+
+
+def drawsAnnotation(func: Callable) -> Callable:
+    # marks a filter that only draws, it can be skipped when nobody sees the frame
+    func.annotation = True
+    return func
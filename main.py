@@ -1,5 +1,11 @@
 from libs.applib import App
+from libs.applib.shard import ShardCoordinator
+from libs.applib.watch import ConfigWatcher
 from toml import loads
+from argparse import ArgumentParser
+import logging
+import signal
+import sys
 
 CONFIG_FILE: str = "config.toml"
 
@@ -10,14 +16,78 @@ def loadConfig(configFile: str) -> dict:
     return configData
 
 
+def parseArgs():
+    parser = ArgumentParser()
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument(
+        "--headless", action="store_true", help="process screens without a window"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="split screens across processes"
+    )
+    parser.add_argument(
+        "--gui", action="store_true", help="show every screen in a Qt window"
+    )
+    parser.add_argument(
+        "--watch", action="store_true", help="apply config file changes while running"
+    )
+    args = parser.parse_args()
+    if args.gui and args.workers > 1:
+        parser.error("--gui runs every screen in one process, drop --workers")
+    if args.watch and args.workers > 1:
+        parser.error("--watch reloads a single process, drop --workers")
+    if args.gui and args.watch:
+        parser.error("--gui keeps its own screen list, drop --watch")
+    return args
+
+
+def runSharded(config: dict, workers: int, display: bool):
+    coordinator = ShardCoordinator(config, workers)
+    coordinator.start()
+
+    try:
+        coordinator.display() if display else coordinator.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        coordinator.stop()
+        coordinator.join()
+        coordinator.close()
+
+
 def main():
-    config = loadConfig(CONFIG_FILE)
+    args = parseArgs()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    config = loadConfig(args.config)
+
+    if args.workers > 1:
+        runSharded(config, args.workers, not args.headless)
+        return
+
     app = App(config)
 
-    app.run(True)
+    if args.watch:
+        watcher = ConfigWatcher(args.config, loadConfig, app.reload)
+        watcher.start()
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda *_: watcher.trigger())
+
+    if args.gui:
+        # Qt is only needed here, keep it out of headless startup
+        from libs.guilib import runGUI
+
+        guiConfig: dict = config.get("gui", dict())
+        sys.exit(runGUI(app, fps=float(guiConfig.get("fps", 0.0))))
+
+    app.run(not args.headless)
 
-    app.capture_thread.join()
-    app.display_thread.join()
+    try:
+        # join in slices so ctrl+c reaches the main thread
+        while app.running:
+            app.join(0.5)
+    except KeyboardInterrupt:
+        app.stop()
+        app.join()
 
 if __name__ == "__main__":
     main()
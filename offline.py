@@ -0,0 +1,37 @@
+from libs.applib.offline import collectVideos, runOffline
+from main import loadConfig, CONFIG_FILE
+from argparse import ArgumentParser
+from os import makedirs
+
+
+def parseArgs():
+    parser = ArgumentParser(description="process recorded video faster than real time")
+    parser.add_argument("inputs", nargs="+", help="video files or directories")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--output", default="output")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--no-video", action="store_true")
+    parser.add_argument("--records", action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = parseArgs()
+    config = loadConfig(args.config)
+    videos = collectVideos(args.inputs)
+    makedirs(args.output, exist_ok=True)
+
+    runOffline(
+        videos,
+        config,
+        args.output,
+        workers=args.workers,
+        batchSize=args.batch,
+        writeVideo=not args.no_video,
+        writeRecords=args.records,
+    )
+
+
+if __name__ == "__main__":
+    main()
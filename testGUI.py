@@ -13,10 +13,13 @@ from PySide6.QtWidgets import (
     QFormLayout,
     QSpinBox,
 )
-from libs.screenlib import Screen
+from libs.screenlib import Screen, SharedFrameRing
+from libs.screenlib.screen import toQImage
 
 source = "http://220.254.72.200/nphMotionJpeg?Resolution=640x640&Quality=Standard"
 src = "rtsp://192.168.1.105:554/user=admin&password=&channel=2&stream=0.sdp?"
+# shm://<name> reads frames published by a running screen, see [screens.*.shared]
+src = sys.argv[1] if len(sys.argv) > 1 else src
 
 
 class ScreenThread(QThread):
@@ -26,9 +29,32 @@ class ScreenThread(QThread):
         QThread.__init__(self, parent)
         self._status: bool = True
         self._origin: bool = True
-        self._screen = Screen(src, name)
+        self._ring: SharedFrameRing | None = None
+        self._screen: Screen | None = None
+
+        if src.startswith("shm://"):
+            self._ring = SharedFrameRing.waitFor(src[len("shm://") :])
+        else:
+            self._screen = Screen(src, name)
+
+    def runShared(self):
+        lastSeq = 0
+        while self._status:
+            frame, _, seq = self._ring.latest()
+            if frame is None or seq == lastSeq:
+                self.msleep(5)
+                continue
+
+            lastSeq = seq
+            self.updateFrame.emit(toQImage(frame))
+
+        self._ring.close()
 
     def run(self):
+        if self._ring is not None:
+            self.runShared()
+            return
+
         while self._status:
             if not self._screen.getNextFrame():
                 continue